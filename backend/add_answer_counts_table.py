@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script to create the answer_counts table behind GET /questions/{id}/distribution
+and fill it from the existing user_responses. Safe to run more than once
+(the counters are rebuilt from scratch).
+"""
+
+import os
+import sys
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import engine, SessionLocal
+from app import crud, models
+
+def add_answer_counts_table():
+    """Create answer_counts if it does not exist yet and backfill it"""
+    try:
+        print("🔧 Creating answer_counts table (if missing)...")
+        models.AnswerCount.__table__.create(bind=engine, checkfirst=True)
+        print(" answer_counts table is ready")
+    except Exception as e:
+        print(f"Error creating answer_counts table: {e}")
+        return False
+
+    db = SessionLocal()
+    try:
+        print("🔧 Rebuilding answer counters from user_responses...")
+        rows = crud.rebuild_answer_counts(db)
+        print(f" {rows} counter rows written")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding answer counters: {e}")
+        return False
+    finally:
+        db.close()
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting answer_counts table migration...")
+    success = add_answer_counts_table()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Script to create the composite indexes declared in app/models.py on an existing database
+(user_chats / user_feedback on usercode+session_no+created_time, user_responses on its
+per-user and per-question access paths). Indexes that already exist are skipped,
+so it is safe to run more than once. Check the result with: python explain_queries.py
+"""
+
+import os
+import sys
+
+from sqlalchemy import inspect
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import Base, engine
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
+def create_composite_indexes(bind) -> int:
+    """Create the multi-column indexes declared on the models that the database does not have yet."""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created = 0
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if len(index.columns) < 2 or index.name in existing:
+                continue
+            index.create(bind=bind)
+            print(f"   Created index {index.name} on {table.name} ({', '.join(c.name for c in index.columns)})")
+            created += 1
+    return created
+
+def add_composite_indexes():
+    """Create missing composite indexes"""
+    try:
+        print("🔧 Creating missing indexes...")
+        created = create_composite_indexes(engine)
+        print(f" {created} index(es) created, the rest already existed")
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting composite index migration...")
+    success = add_composite_indexes()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
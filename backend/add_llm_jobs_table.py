@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script to create the llm_jobs table used by the final-feedback job API
+(POST /v1/survey/final_feedback/jobs). Safe to run more than once.
+"""
+
+import os
+import sys
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import engine
+from app import models
+
+def add_llm_jobs_table():
+    """Create llm_jobs if it does not exist yet"""
+    try:
+        print("🔧 Creating llm_jobs table (if missing)...")
+        models.LLMJob.__table__.create(bind=engine, checkfirst=True)
+        print(" llm_jobs table is ready")
+    except Exception as e:
+        print(f"Error creating llm_jobs table: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting llm_jobs table migration...")
+    success = add_llm_jobs_table()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script to create the submission_keys table used for idempotent survey submits
+(Idempotency-Key on POST /submit_survey). Safe to run more than once.
+"""
+
+import os
+import sys
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import engine
+from app import models
+
+def add_submission_keys_table():
+    """Create submission_keys if it does not exist yet"""
+    try:
+        print("🔧 Creating submission_keys table (if missing)...")
+        models.SubmissionKey.__table__.create(bind=engine, checkfirst=True)
+        print(" submission_keys table is ready")
+    except Exception as e:
+        print(f"Error creating submission_keys table: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting submission_keys table migration...")
+    success = add_submission_keys_table()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Script to add the ttft_ms (time to first token) column to user_chats
+Run this once on existing databases before using /v1/chat/stream
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import DATABASE_URL
+
+def add_ttft_column():
+    """Add ttft_ms column to user_chats table"""
+    try:
+        engine = create_engine(DATABASE_URL)
+
+        with engine.connect() as connection:
+            # Check if ttft_ms column already exists
+            result = connection.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                AND table_name = 'user_chats'
+                AND column_name = 'ttft_ms'
+            """))
+
+            if result.fetchone():
+                print(" ttft_ms column already exists in user_chats table")
+                return True
+
+            print("🔧 Adding ttft_ms column to user_chats table...")
+            connection.execute(text("""
+                ALTER TABLE user_chats
+                ADD COLUMN ttft_ms INT NULL
+            """))
+
+            connection.commit()
+            print(" Successfully added ttft_ms column to user_chats table")
+
+    except Exception as e:
+        print(f"Error adding ttft_ms column: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting ttft_ms column migration...")
+    success = add_ttft_column()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
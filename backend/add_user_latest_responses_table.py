@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script to create the user_latest_responses table behind GET /user_latest_responses/{usercode}
+and fill it from the existing user_responses. Safe to run more than once
+(the table is rebuilt from scratch).
+"""
+
+import os
+import sys
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import engine, SessionLocal
+from app import crud, models
+
+def add_user_latest_responses_table():
+    """Create user_latest_responses if it does not exist yet and backfill it"""
+    try:
+        print("🔧 Creating user_latest_responses table (if missing)...")
+        models.UserLatestResponse.__table__.create(bind=engine, checkfirst=True)
+        print(" user_latest_responses table is ready")
+    except Exception as e:
+        print(f"Error creating user_latest_responses table: {e}")
+        return False
+
+    db = SessionLocal()
+    try:
+        print("🔧 Rebuilding latest answers from user_responses...")
+        rows = crud.rebuild_latest_responses(db)
+        print(f" {rows} latest-answer rows written")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding latest answers: {e}")
+        return False
+    finally:
+        db.close()
+
+    return True
+
+if __name__ == "__main__":
+    print("Starting user_latest_responses table migration...")
+    success = add_user_latest_responses_table()
+    if success:
+        print("Migration completed successfully!")
+    else:
+        print("Migration failed!")
+        sys.exit(1)
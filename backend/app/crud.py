@@ -1,11 +1,235 @@
-from typing import List, Optional
+import base64
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 from . import models
 
-# ---- UserChat ----
-def create_user_chat(
+# create_user_chat / create_user_feedback have *_async twins for AsyncSession (used by the async LLM endpoints)
+
+# ---- Keyset pagination on (created_time, id) ----
+# Cursors are opaque to clients: base64url JSON of the last row's sort key.
+# NULL created_time (rows from before the timestamp migration) sorts lowest, as in MySQL and SQLite.
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+def encode_cursor(row) -> str:
+    key = {"t": row.created_time.isoformat() if row.created_time else None, "id": row.id}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], Any]:
+    """Raises ValueError on anything that isn't a cursor we issued."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(key["t"]) if key["t"] else None), key["id"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _keyset_order(model, descending: bool):
+    if descending:
+        return (model.created_time.desc(), model.id.desc())
+    return (model.created_time.asc(), model.id.asc())
+
+def _after_cursor(model, cursor: str, descending: bool):
+    """WHERE clause for the rows that come after the cursor in _keyset_order."""
+    t, last_id = decode_cursor(cursor)
+    ct, id_ = model.created_time, model.id
+    if descending:
+        if t is None:
+            return and_(ct.is_(None), id_ < last_id)
+        return or_(ct < t, and_(ct == t, id_ < last_id), ct.is_(None))
+    if t is None:
+        return or_(and_(ct.is_(None), id_ > last_id), ct.isnot(None))
+    return or_(ct > t, and_(ct == t, id_ > last_id))
+
+def _page_size(limit: Optional[int]) -> int:
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+def keyset_query(q, model, *, cursor: Optional[str], limit: Optional[int], descending: bool = True):
+    """The page query keyset_page runs: one row more than the page, to tell whether another follows."""
+    if cursor:
+        q = q.filter(_after_cursor(model, cursor, descending))
+    return q.order_by(*_keyset_order(model, descending)).limit(_page_size(limit) + 1)
+
+def keyset_page(q, model, *, cursor: Optional[str], limit: Optional[int], descending: bool = True) -> Tuple[List[Any], Optional[str]]:
+    """One page of a Query ordered by (created_time, id) plus the cursor for the next page (None on the last)."""
+    size = _page_size(limit)
+    rows = keyset_query(q, model, cursor=cursor, limit=limit, descending=descending).all()
+    return rows[:size], (encode_cursor(rows[size - 1]) if len(rows) > size else None)
+
+# ---- Users ----
+def list_users(db: Session, *, cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[models.User], Optional[str]]:
+    """Users in registration order."""
+    return keyset_page(db.query(models.User), models.User, cursor=cursor, limit=limit, descending=False)
+
+# ---- UserResponse ----
+def list_user_responses(db: Session, usercode: str, *, cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[models.UserResponse], Optional[str]]:
+    """Newest first."""
+    q = db.query(models.UserResponse).filter(models.UserResponse.usercode == usercode)
+    return keyset_page(q, models.UserResponse, cursor=cursor, limit=limit)
+
+def create_user_responses(db: Session, *, usercode: str, session_no: int, answers: Dict[int, int]) -> int:
+    """Insert one survey run's answers ({question_id: answer}) as one executemany INSERT; no commit."""
+    now = datetime.utcnow()
+    rows = []
+    for qid, answer in answers.items():
+        rows.append({
+            "question_id": qid,
+            "answer": answer,
+            "usercode": usercode,
+            "session_no": session_no,
+            "created_time": now,
+        })
+    if rows:
+        # Parameters passed separately (not .values(rows)), so the compiled INSERT is cached across submits
+        db.execute(insert(models.UserResponse), rows)
+    return len(rows)
+
+# ---- AnswerCount (answer histogram counters) ----
+# Demographic columns of users that /questions/{id}/distribution can filter on
+DEMOGRAPHIC_DIMENSIONS = ("age", "gender", "country", "education", "field", "yearsOfStudy")
+
+def _dialect_insert(db: Session):
+    """(dialect name, insert construct with upsert support) for the session's database (MySQL, SQLite, PostgreSQL)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect, dialect_insert
+
+def _upsert_add(db: Session, table, rows: List[Dict[str, Any]], key: List[str], column: str) -> None:
+    """INSERT rows, or add rows[column] to the existing value on a key clash."""
+    dialect, dialect_insert = _dialect_insert(db)
+    stmt = dialect_insert(table)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column]})
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=key, set_={column: table.c[column] + stmt.excluded[column]})
+    # executemany with one cached statement; a .values(rows) statement would be recompiled for every call
+    db.execute(stmt, rows)
+
+def increment_answer_counts(db: Session, *, user: models.User, session_no: int, answers: Dict[int, int]) -> None:
+    """Count one survey run's answers overall and per demographic, in one upsert; no commit."""
+    buckets = [("all", "")] + [(dim, str(getattr(user, dim) or "")) for dim in DEMOGRAPHIC_DIMENSIONS]
+    counts: Dict[tuple, int] = {}
+    for qid, answer in answers.items():
+        for dimension, dim_value in buckets:
+            key = (qid, dimension, dim_value, session_no, answer)
+            counts[key] = counts.get(key, 0) + 1
+    if not counts:
+        return
+    rows = [
+        {"question_id": q, "dimension": dim, "dim_value": val, "session_no": sn, "answer": a, "count": n}
+        for (q, dim, val, sn, a), n in counts.items()
+    ]
+    _upsert_add(
+        db, models.AnswerCount.__table__, rows,
+        key=["question_id", "dimension", "dim_value", "session_no", "answer"], column="count",
+    )
+
+def answer_distribution(
     db: Session,
+    question_id: int,
+    *,
+    session_no: Optional[int] = None,
+    dimension: str = "all",
+    dim_value: str = "",
+) -> Dict[int, int]:
+    """{answer: count} for one question, from the counters (never scans user_responses)."""
+    q = db.query(models.AnswerCount.answer, func.sum(models.AnswerCount.count)).filter(
+        models.AnswerCount.question_id == question_id,
+        models.AnswerCount.dimension == dimension,
+        models.AnswerCount.dim_value == dim_value,
+    )
+    if session_no is not None:
+        q = q.filter(models.AnswerCount.session_no == session_no)
+    return {int(answer): int(total) for answer, total in q.group_by(models.AnswerCount.answer).all()}
+
+def rebuild_answer_counts(db: Session) -> int:
+    """Recompute every counter from user_responses (backfill / repair). Returns the number of counter rows."""
+    UR, U = models.UserResponse, models.User
+    db.query(models.AnswerCount).delete(synchronize_session=False)
+    rows: List[Dict[str, Any]] = []
+    for dimension in ("all",) + DEMOGRAPHIC_DIMENSIONS:
+        dim_col = func.coalesce(getattr(U, dimension), "") if dimension != "all" else None
+        cols = [UR.question_id, func.coalesce(UR.session_no, 0), UR.answer] + ([dim_col] if dim_col is not None else [])
+        q = db.query(*cols, func.count()).select_from(UR).filter(UR.question_id.isnot(None), UR.answer.isnot(None))
+        if dim_col is not None:
+            q = q.join(U, U.usercode == UR.usercode)
+        for row in q.group_by(*cols).all():
+            question_id, session_no, answer = row[0], row[1], row[2]
+            rows.append({
+                "question_id": question_id,
+                "dimension": dimension,
+                "dim_value": str(row[3]) if dim_col is not None else "",
+                "session_no": session_no,
+                "answer": answer,
+                "count": row[-1],
+            })
+    for i in range(0, len(rows), 1000):
+        db.execute(insert(models.AnswerCount).values(rows[i:i + 1000]))
+    db.commit()
+    return len(rows)
+
+# ---- UserLatestResponse (latest answer per user and question) ----
+_LATEST_COLUMNS = ["usercode", "question_id", "response_id", "answer", "session_no", "created_time"]
+
+def _latest_source():
+    UR = models.UserResponse.__table__
+    return select(UR.c.usercode, UR.c.question_id, UR.c.id, UR.c.answer, UR.c.session_no, UR.c.created_time).where(
+        UR.c.usercode.isnot(None), UR.c.question_id.isnot(None)
+    )
+
+def update_latest_responses(db: Session, *, usercode: str, session_no: int) -> None:
+    """Point user_latest_responses at the answers of this survey run (one INSERT ... SELECT upsert); no commit."""
+    UR = models.UserResponse.__table__
+    table = models.UserLatestResponse.__table__
+    source = _latest_source().where(UR.c.usercode == usercode, UR.c.session_no == session_no)
+    dialect, dialect_insert = _dialect_insert(db)
+    stmt = dialect_insert(table).from_select(_LATEST_COLUMNS, source)
+    replaced = [c for c in _LATEST_COLUMNS if c not in ("usercode", "question_id")]
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in replaced})
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=["usercode", "question_id"], set_={c: stmt.excluded[c] for c in replaced})
+    db.execute(stmt)
+
+def list_latest_responses(db: Session, usercode: str) -> List[models.UserLatestResponse]:
+    """A user's latest answer per question (primary-key lookup)."""
+    return db.query(models.UserLatestResponse).filter(
+        models.UserLatestResponse.usercode == usercode
+    ).order_by(models.UserLatestResponse.question_id).all()
+
+def rebuild_latest_responses(db: Session) -> int:
+    """Recompute user_latest_responses from user_responses (backfill / repair). Returns the number of rows."""
+    UR = models.UserResponse.__table__
+    newer = UR.alias("newer")
+    epoch = datetime(1970, 1, 1)    # rows without a created_time count as oldest
+    ct, newer_ct = func.coalesce(UR.c.created_time, epoch), func.coalesce(newer.c.created_time, epoch)
+    # Latest = no row for the same user and question with a later created_time (ties: the higher id)
+    source = _latest_source().where(
+        ~select(newer.c.id).where(
+            newer.c.usercode == UR.c.usercode,
+            newer.c.question_id == UR.c.question_id,
+            or_(
+                newer_ct > ct,
+                and_(newer_ct == ct, newer.c.id > UR.c.id),
+            ),
+        ).exists()
+    )
+    db.query(models.UserLatestResponse).delete(synchronize_session=False)
+    db.execute(insert(models.UserLatestResponse).from_select(_LATEST_COLUMNS, source))
+    db.commit()
+    return db.query(func.count()).select_from(models.UserLatestResponse).scalar()
+
+# ---- UserChat ----
+def _user_chat(
     *,
     usercode: Optional[str],
     user_message: str,
@@ -15,9 +239,10 @@ def create_user_chat(
     tokens_in: int,
     tokens_out: int,
     latency_ms: int,
-    session_no: int
+    session_no: int,
+    ttft_ms: Optional[int] = None
 ) -> models.UserChat:
-    rec = models.UserChat(
+    return models.UserChat(
         usercode=usercode,
         user_message=user_message,
         ai_response=ai_response,
@@ -26,23 +251,35 @@ def create_user_chat(
         tokens_in=tokens_in,
         tokens_out=tokens_out,
         latency_ms=latency_ms,
+        ttft_ms=ttft_ms,
         session_no=session_no,
         created_time=datetime.utcnow(),
     )
+
+def create_user_chat(db: Session, **fields) -> models.UserChat:
+    rec = _user_chat(**fields)
     db.add(rec)
     db.commit()
     db.refresh(rec)
     return rec
 
-def list_user_chats(db: Session, usercode: str, *, session_no: Optional[int] = None, limit: int = 200) -> List[models.UserChat]:
+async def create_user_chat_async(db: AsyncSession, **fields) -> models.UserChat:
+    rec = _user_chat(**fields)
+    db.add(rec)
+    await db.commit()
+    await db.refresh(rec)
+    return rec
+
+def list_user_chats(
+    db: Session, usercode: str, *, session_no: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[models.UserChat], Optional[str]]:
     q = db.query(models.UserChat).filter(models.UserChat.usercode == usercode)
     if session_no is not None:
         q = q.filter(models.UserChat.session_no == session_no)
-    return q.order_by(models.UserChat.created_time.desc()).limit(limit).all()
+    return keyset_page(q, models.UserChat, cursor=cursor, limit=limit)
 
 # ---- UserFeedback ----
-def create_user_feedback(
-    db: Session,
+def _user_feedback(
     *,
     usercode: str,
     question_id: int,
@@ -50,7 +287,7 @@ def create_user_feedback(
     feedback_type: str = "general",
     session_no: int
 ) -> models.UserFeedback:
-    rec = models.UserFeedback(
+    return models.UserFeedback(
         usercode=usercode,
         question_id=question_id,
         feedback_text=feedback_text,
@@ -58,13 +295,158 @@ def create_user_feedback(
         session_no=session_no,
         created_time=datetime.utcnow(),
     )
+
+def create_user_feedback(db: Session, **fields) -> models.UserFeedback:
+    rec = _user_feedback(**fields)
     db.add(rec)
     db.commit()
     db.refresh(rec)
     return rec
 
-def list_user_feedback(db: Session, usercode: str, *, session_no: Optional[int] = None, limit: int = 200) -> List[models.UserFeedback]:
+def add_user_feedback(db: Session, **fields) -> models.UserFeedback:
+    """Insert in the caller's transaction (flushed, so rec.id is set; not committed)."""
+    rec = _user_feedback(**fields)
+    db.add(rec)
+    db.flush()
+    return rec
+
+async def create_user_feedback_async(db: AsyncSession, **fields) -> models.UserFeedback:
+    rec = _user_feedback(**fields)
+    db.add(rec)
+    await db.commit()
+    await db.refresh(rec)
+    return rec
+
+def list_user_feedback(
+    db: Session, usercode: str, *, session_no: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[models.UserFeedback], Optional[str]]:
     q = db.query(models.UserFeedback).filter(models.UserFeedback.usercode == usercode)
     if session_no is not None:
         q = q.filter(models.UserFeedback.session_no == session_no)
-    return q.order_by(models.UserFeedback.created_time.desc()).limit(limit).all()
+    return keyset_page(q, models.UserFeedback, cursor=cursor, limit=limit)
+
+# ---- User ----
+async def user_exists_async(db: AsyncSession, usercode: str) -> bool:
+    result = await db.execute(select(models.User.id).where(models.User.usercode == usercode).limit(1))
+    return result.first() is not None
+
+# ---- Question ----
+async def get_question_async(db: AsyncSession, question_id: int) -> Optional[models.Question]:
+    result = await db.execute(select(models.Question).where(models.Question.id == question_id))
+    return result.scalars().first()
+
+# ---- LLMJob ----
+def create_llm_job(db: Session, *, kind: str, usercode: str, session_no: int, payload: Dict[str, Any]) -> models.LLMJob:
+    rec = models.LLMJob(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        usercode=usercode,
+        session_no=session_no,
+        status="queued",
+        payload=json.dumps(payload),
+        attempts=0,
+        created_time=datetime.utcnow(),
+    )
+    db.add(rec)
+    db.commit()
+    db.refresh(rec)
+    return rec
+
+def get_llm_job(db: Session, job_id: str) -> Optional[models.LLMJob]:
+    return db.query(models.LLMJob).filter(models.LLMJob.id == job_id).first()
+
+def list_llm_jobs(db: Session, usercode: str, *, session_no: Optional[int] = None, limit: int = 200) -> List[models.LLMJob]:
+    q = db.query(models.LLMJob).filter(models.LLMJob.usercode == usercode)
+    if session_no is not None:
+        q = q.filter(models.LLMJob.session_no == session_no)
+    return q.order_by(models.LLMJob.created_time.desc()).limit(limit).all()
+
+def _claimable(now: datetime):
+    # queued jobs use lease_expires as "not before" (retry backoff); running ones as the worker lease
+    return or_(
+        (models.LLMJob.status == "queued") & (or_(models.LLMJob.lease_expires.is_(None), models.LLMJob.lease_expires <= now)),
+        (models.LLMJob.status == "running") & (models.LLMJob.lease_expires < now),
+    )
+
+def claimable_llm_job_ids(db: Session, *, limit: int) -> List[str]:
+    """Queued jobs plus running jobs whose worker lease ran out (worker crashed or restarted)."""
+    now = datetime.utcnow()
+    rows = db.query(models.LLMJob.id).filter(_claimable(now)).order_by(models.LLMJob.created_time.asc()).limit(limit).all()
+    return [r.id for r in rows]
+
+def claim_llm_job(db: Session, job_id: str, *, worker_id: str, lease_s: float) -> bool:
+    """Atomically take a job; False if another worker got it first."""
+    now = datetime.utcnow()
+    claimed = db.query(models.LLMJob).filter(
+        models.LLMJob.id == job_id,
+        _claimable(now),
+    ).update({
+        models.LLMJob.status: "running",
+        models.LLMJob.worker_id: worker_id,
+        models.LLMJob.lease_expires: now + timedelta(seconds=lease_s),
+        models.LLMJob.attempts: models.LLMJob.attempts + 1,
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def finish_llm_job(
+    db: Session,
+    job_id: str,
+    *,
+    status: str,
+    result_text: Optional[str] = None,
+    feedback_id: Optional[int] = None,
+    error: Optional[str] = None,
+    retry_after_s: Optional[float] = None,
+    worker_id: Optional[str] = None,
+) -> bool:
+    """
+    Set the job's outcome and commit the caller's transaction with it.
+    With worker_id, only while that worker still holds the job (its lease wasn't taken over);
+    otherwise the whole transaction is rolled back and False is returned.
+    """
+    q = db.query(models.LLMJob).filter(models.LLMJob.id == job_id)
+    if worker_id is not None:
+        q = q.filter(models.LLMJob.status == "running", models.LLMJob.worker_id == worker_id)
+    updated = q.update({
+        models.LLMJob.status: status,
+        models.LLMJob.result_text: result_text,
+        models.LLMJob.feedback_id: feedback_id,
+        models.LLMJob.error: error,
+        models.LLMJob.lease_expires: datetime.utcnow() + timedelta(seconds=retry_after_s) if retry_after_s else None,
+        models.LLMJob.finished_time: datetime.utcnow() if status in ("done", "failed") else None,
+    }, synchronize_session=False)
+    if not updated:
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+def release_llm_jobs(db: Session, *, worker_id: str) -> int:
+    """Put this worker's running jobs back in the queue (graceful shutdown)."""
+    released = db.query(models.LLMJob).filter(
+        models.LLMJob.status == "running",
+        models.LLMJob.worker_id == worker_id,
+    ).update({
+        models.LLMJob.status: "queued",
+        models.LLMJob.lease_expires: None,
+        models.LLMJob.attempts: models.LLMJob.attempts - 1,   # interrupted, not failed
+    }, synchronize_session=False)
+    db.commit()
+    return released
+
+# ---- SubmissionKey (idempotent /submit_survey) ----
+def get_submission_key(db: Session, key: str) -> Optional[models.SubmissionKey]:
+    return db.query(models.SubmissionKey).filter(models.SubmissionKey.key == key).first()
+
+def add_submission_key(db: Session, *, key: str, usercode: str, session_no: int) -> None:
+    """Record the key in the caller's transaction; a concurrent duplicate fails with IntegrityError."""
+    db.add(models.SubmissionKey(key=key, usercode=usercode, session_no=session_no, created_time=datetime.utcnow()))
+    db.flush()
+
+def purge_submission_keys(db: Session, *, ttl_s: float) -> int:
+    deleted = db.query(models.SubmissionKey).filter(
+        models.SubmissionKey.created_time < datetime.utcnow() - timedelta(seconds=ttl_s)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -1,7 +1,11 @@
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from .pool_metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, track_engine
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,26 +18,157 @@ DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "campus_smartphone_addiction")
 
-# MySQL connection URL
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-# Create engine with MySQL-specific configurations
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verify connection before use
-    pool_recycle=3600,   # Recycle connections every hour
-    echo=False,          # Set to True for SQL debugging
-    # MySQL-specific connection arguments
-    connect_args={
-        "charset": "utf8mb4",
-        "autocommit": False,
-        "ssl": False,  # Set to True if using SSL
+# DATABASE_URL (as set in deployments/docker-compose.yml) wins; otherwise MySQL from the DB_* settings.
+# Also works with sqlite:///./campus.db, sqlite:// (in-memory) and postgresql+psycopg2://...
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# sync driver -> asyncio driver for the same database
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+ASYNC_PACKAGES = {"mysql": "aiomysql", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# In-memory SQLite is opened as one named, shared-cache database so the sync and async
+# engines see the same tables
+SQLITE_MEMORY_DB = "file:campus_memdb"
+
+def is_memory_database(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (url.database in (None, "", ":memory:") or "mode=memory" in str(url))
+
+def _normalize_url(url):
+    url = make_url(url)
+    if is_memory_database(url) and "mode=memory" not in str(url):
+        url = url.set(database=SQLITE_MEMORY_DB, query={"mode": "memory", "cache": "shared", "uri": "true"})
+    return url
+
+# Connection pool (per engine; the async engine has its own pool of the same size)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))              # connections kept open
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))       # extra connections under load, closed when returned
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # seconds to wait for a free connection before failing
+# true: SELECT 1 on every checkout (pessimistic); false: rely on DB_POOL_RECYCLE and on
+# invalidating the pool when a query hits a dropped connection (optimistic, one less round trip)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))     # seconds; keep below MySQL wait_timeout, -1 = never
+
+def pool_options(is_async: bool = False) -> dict:
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
     }
-)
+
+def engine_options(url) -> dict:
+    """create_engine / create_async_engine keyword arguments tuned for the URL's backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    is_async = url.drivername in ASYNC_DRIVERS.values()
+    if backend == "sqlite":
+        options = {"echo": False, "connect_args": {"check_same_thread": False}}
+        if is_memory_database(url):
+            options["poolclass"] = StaticPool    # one connection keeps the in-memory database alive
+        else:
+            options.update(pool_options(is_async), pool_pre_ping=False)    # a local file can't drop the connection
+        return options
+    options = {
+        **pool_options(is_async),
+        "echo": False,          # Set to True for SQL debugging
+    }
+    if backend == "mysql":
+        # MySQL-specific connection arguments
+        options["connect_args"] = {
+            "charset": "utf8mb4",
+            "autocommit": False,
+        }
+        if not url.drivername.endswith("aiomysql"):
+            options["connect_args"]["ssl"] = False  # Set to True if using SSL
+    elif backend == "postgresql" and url.drivername in ("postgresql", "postgresql+psycopg2"):
+        options["connect_args"] = {"application_name": "campus_smartphone_addiction"}
+    return options
+
+# Transactions take the write lock up front (BEGIN IMMEDIATE) so two requests that read first and
+# write later queue on busy_timeout instead of one failing with "database is locked" on the upgrade
+SQLITE_BEGIN = os.getenv("SQLITE_BEGIN", "IMMEDIATE").upper()    # DEFERRED | IMMEDIATE | EXCLUSIVE
+# Waiters poll for the lock, so under a burst of writers one can lose for seconds; be generous
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers run alongside the single writer; busy_timeout waits for the write lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")    # MySQL enforces them, so SQLite should too
+    cursor.close()
+
+def _sqlite_autocommit_driver(dbapi_connection, connection_record) -> None:
+    dbapi_connection.isolation_level = None    # the driver's own BEGIN handling is replaced by _sqlite_begin
+
+def _sqlite_begin(connection) -> None:
+    connection.exec_driver_sql(f"BEGIN {SQLITE_BEGIN}")
+
+def _tune_sqlite(sync_engine) -> None:
+    event.listen(sync_engine, "connect", _sqlite_pragmas)
+    # The in-memory database has a single shared connection (StaticPool) and no lock to wait for
+    if not is_memory_database(sync_engine.url):
+        event.listen(sync_engine, "connect", _sqlite_autocommit_driver)
+        event.listen(sync_engine, "begin", _sqlite_begin)
+
+def create_db_engine(url=None, name: str = None, **overrides):
+    """
+    Engine for url (default DATABASE_URL) with the backend tuning from engine_options().
+    With a name, its pool shows up in GET /db/pool under that name.
+    """
+    url = _normalize_url(url or DATABASE_URL)
+    options = {**engine_options(url), **overrides}
+    if name:
+        options["pool_logging_name"] = name
+    new_engine = create_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        _tune_sqlite(new_engine)
+    if name:
+        track_engine(new_engine, name)
+    return new_engine
+
+engine = create_db_engine(name="primary")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# ---- Async engine (used by the async LLM endpoints so DB round trips don't block the event loop) ----
+
+def async_url_for(url):
+    """Same database, asyncio driver (ASYNC_DATABASE_URL overrides)."""
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return _normalize_url(override)
+    u = _normalize_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.get_backend_name(), u.drivername))
+
+def _create_async_engine():
+    url = async_url_for(DATABASE_URL)
+    try:
+        new_engine = create_async_engine(url, **engine_options(url), pool_logging_name="primary_async")
+    except ImportError as e:
+        print(f"[WARN] Async database driver not installed ({e}); async endpoints are unavailable. "
+              f"pip install {ASYNC_PACKAGES.get(url.get_backend_name(), 'aiomysql')}")
+        return None
+    if url.get_backend_name() == "sqlite":
+        _tune_sqlite(new_engine.sync_engine)
+    track_engine(new_engine.sync_engine, "primary_async")
+    return new_engine
+
+async_engine = _create_async_engine()
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -41,6 +176,13 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        backend = make_url(DATABASE_URL).get_backend_name()
+        raise RuntimeError(f"Async database driver not installed (pip install {ASYNC_PACKAGES.get(backend, 'aiomysql')})")
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Test database connection
 
 def test_connection():
@@ -0,0 +1,105 @@
+"""
+Streaming export of study data as NDJSON or CSV.
+Rows are read with a server-side cursor (stream_results + yield_per) as plain
+column tuples, never ORM objects, and each one is written out as soon as it is
+fetched, so memory stays flat however many participants there are.
+Used by GET /export/{table} and the export_data.py CLI.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import select
+
+from . import models
+
+EXPORT_TABLES = {
+    "users": models.User,
+    "responses": models.UserResponse,
+    "chats": models.UserChat,
+    "feedback": models.UserFeedback,
+}
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))   # rows per fetch from the server-side cursor
+
+def export_statement(
+    table: str,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session_no: Optional[int] = None,
+    usercode: Optional[str] = None,
+):
+    """SELECT for one export table with the optional filters (created_time range, session, participant)."""
+    model = EXPORT_TABLES[table]
+    t = model.__table__
+    stmt = select(t)
+    if since is not None:
+        stmt = stmt.where(t.c.created_time >= since)
+    if until is not None:
+        stmt = stmt.where(t.c.created_time < until)
+    if session_no is not None:
+        if "session_no" not in t.c:
+            raise ValueError(f"'{table}' has no session_no; the session filter applies to responses, chats and feedback")
+        stmt = stmt.where(t.c.session_no == session_no)
+    if usercode is not None:
+        stmt = stmt.where(t.c.usercode == usercode)
+    return stmt.order_by(t.c.id)
+
+def iter_rows(engine, stmt, yield_per: int = EXPORT_YIELD_PER) -> Iterator[Dict[str, Any]]:
+    """Yield rows as dicts while the server-side cursor is read in yield_per batches."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=yield_per).execute(stmt)
+        for row in result.mappings():
+            yield dict(row)
+
+def _jsonable(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def ndjson_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps({k: _jsonable(v) for k, v in row.items()}, ensure_ascii=False) + "\n"
+
+def csv_lines(columns, rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=list(columns), extrasaction="ignore")
+
+    def take() -> str:
+        line = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return line
+
+    writer.writeheader()
+    yield take()
+    for row in rows:
+        writer.writerow({k: _jsonable(v) for k, v in row.items()})
+        yield take()
+
+def export_lines(engine, table: str, fmt: str, **filters) -> Iterator[str]:
+    """Lines of one table in the given format; the query runs when iteration starts."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table '{table}'; use one of {', '.join(EXPORT_TABLES)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'; use one of {', '.join(EXPORT_FORMATS)}")
+    stmt = export_statement(table, **filters)    # validate filters before any output
+    rows = iter_rows(engine, stmt)
+    if fmt == "csv":
+        return csv_lines(EXPORT_TABLES[table].__table__.columns.keys(), rows)
+    return ndjson_lines(rows)
+
+def chunked(lines: Iterator[str], size: int = 64 * 1024) -> Iterator[str]:
+    """Group lines into ~size-character chunks (fewer, larger writes to the HTTP response)."""
+    parts, length = [], 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(parts)
+            parts, length = [], 0
+    if parts:
+        yield "".join(parts)
@@ -0,0 +1,77 @@
+"""
+In-process TTL/LRU cache for per-question answer feedback.
+The SAS-SV survey has few (question, answer) combinations, so identical prompts
+would otherwise go to the GPU again and again.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class FeedbackCache:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("FEEDBACK_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.max_entries = int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "512"))
+        self.ttl_s = float(os.getenv("FEEDBACK_CACHE_TTL_S", "3600"))      # 0 = never expire
+        self.model = os.getenv("LLM_MODEL_ID", "mistralai/Mistral-7B-Instruct-v0.3")
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(
+        self,
+        survey_id: Optional[str],
+        question_id: int,
+        question_text: str,
+        answer: int,
+        max_new_tokens: int,
+        temperature: float,
+    ) -> Tuple:
+        # The prompt embeds the question text, so a reworded question must not hit the old entry
+        text_hash = hashlib.sha1(question_text.encode("utf-8")).hexdigest()[:16]
+        return (survey_id, question_id, text_hash, answer, max_new_tokens, round(float(temperature), 4), self.model)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, value = entry
+        if self.ttl_s and time.monotonic() - stored_at > self.ttl_s:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "model": self.model,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+# Global instance
+feedback_cache = FeedbackCache()
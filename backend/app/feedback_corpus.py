@@ -0,0 +1,70 @@
+"""
+Precomputed answer-feedback corpus.
+Written offline by precompute_feedback.py and served by /v1/survey/answer_feedback
+so a lecture-hall session does not hit the GPU for every participant.
+"""
+
+import json
+import os
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+class FeedbackCorpus:
+    def __init__(self, corpus_path: Optional[str] = None):
+        self.enabled = os.getenv("FEEDBACK_CORPUS_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.corpus_path = corpus_path or os.getenv("FEEDBACK_CORPUS_FILE", "feedback_corpus.json")
+        self.metadata: Dict[str, Any] = {}
+        self._variants: Dict[Tuple[str, int, int], List[str]] = {}
+        self.served = 0
+        self.load()
+
+    def path(self) -> Path:
+        path = Path(self.corpus_path)
+        return path if path.is_absolute() else Path(__file__).parent.parent / path
+
+    def load(self) -> bool:
+        """Load the corpus file; a missing file just means an empty corpus."""
+        self._variants = {}
+        self.metadata = {}
+        try:
+            with open(self.path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except json.JSONDecodeError as e:
+            print(f" Error parsing feedback corpus: {e}. Serving feedback live.")
+            return False
+
+        self.metadata = data.get("metadata", {})
+        for entry in data.get("entries", []):
+            text = entry.get("text")
+            if not text:
+                continue
+            key = (entry.get("survey_id"), int(entry["question_id"]), int(entry["answer"]))
+            self._variants.setdefault(key, []).append(text)
+        print(f" Feedback corpus loaded: {len(self._variants)} (question, answer) pairs")
+        return True
+
+    def pick(self, survey_id: Optional[str], question_id: int, answer: int) -> Optional[str]:
+        """Return one stored variant for this pair, or None if it was not precomputed."""
+        if not self.enabled:
+            return None
+        variants = self._variants.get((survey_id, question_id, answer))
+        if not variants:
+            return None
+        self.served += 1
+        return random.choice(variants)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path()),
+            "pairs": len(self._variants),
+            "texts": sum(len(v) for v in self._variants.values()),
+            "served": self.served,
+            "metadata": self.metadata,
+        }
+
+# Global instance
+feedback_corpus = FeedbackCorpus()
@@ -0,0 +1,88 @@
+"""
+Background health monitor for the database and the LLM backend(s).
+Probes run on their own schedule and the last result is cached, so /readyz
+answers instantly and startup never waits for the GPU to warm up.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .database import engine
+from .llm_client import LLMClient
+
+def _db_ping() -> None:
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+
+class HealthMonitor:
+    def __init__(self, llm: LLMClient) -> None:
+        self.llm_client = llm
+        self.llm_interval_s = float(os.getenv("LLM_HEALTH_INTERVAL", "5.0"))
+        self.db_interval_s = float(os.getenv("DB_HEALTH_INTERVAL", "15.0"))
+
+        self.llm = self._blank()
+        self.db = self._blank()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def _blank() -> Dict[str, Any]:
+        return {"ready": False, "checked_at": None, "last_ready_at": None, "consecutive_failures": 0, "error": None}
+
+    def _update(self, name: str, state: Dict[str, Any], ok: bool, error: Optional[str]) -> None:
+        now = datetime.utcnow().isoformat()
+        if ok != state["ready"]:
+            print(f" {'✅' if ok else '⚠️ '} {name} is {'ready' if ok else 'not ready'}{'' if ok else f': {error}'}")
+        state["ready"] = ok
+        state["checked_at"] = now
+        state["error"] = error
+        if ok:
+            state["last_ready_at"] = now
+            state["consecutive_failures"] = 0
+        else:
+            state["consecutive_failures"] += 1
+
+    # -------- probes --------
+
+    async def check_llm(self) -> None:
+        try:
+            backends = await self.llm_client.healthz_all()
+        except Exception as e:
+            self._update("LLM", self.llm, False, str(e) or type(e).__name__)
+            return
+        healthy = [b for b in backends if b["healthy"]]
+        self.llm["backends"] = [{"url": b["url"], "healthy": b["healthy"]} for b in backends]
+        error = None if healthy else "; ".join(f"{b['url']}: {b.get('error')}" for b in backends)
+        self._update("LLM", self.llm, bool(healthy), error)
+
+    async def check_db(self) -> None:
+        try:
+            # Blocking driver call: keep it off the event loop
+            await asyncio.to_thread(_db_ping)
+        except Exception as e:
+            self._update("Database", self.db, False, str(e).splitlines()[0] if str(e) else type(e).__name__)
+            return
+        self._update("Database", self.db, True, None)
+
+    async def _loop(self, probe, interval_s: float) -> None:
+        while True:
+            await probe()
+            await asyncio.sleep(interval_s)
+
+    # -------- lifecycle --------
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._loop(self.check_db, self.db_interval_s)),
+            asyncio.create_task(self._loop(self.check_llm, self.llm_interval_s)),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"db": dict(self.db), "llm": dict(self.llm)}
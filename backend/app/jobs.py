@@ -0,0 +1,179 @@
+"""
+Background jobs for long LLM generations (final feedback).
+Jobs live in the llm_jobs table, so a worker restart only delays them: queued jobs
+and running jobs whose lease expired are picked up again by the poll loop.
+"""
+
+import asyncio
+import json
+import os
+import socket
+from typing import List, Optional, Set, Tuple
+
+from . import crud, models
+from .database import SessionLocal
+from .llm_client import LLMClient
+from .user_cache import user_cache
+
+class FinalFeedbackJobRunner:
+    kind = "final_feedback"
+
+    def __init__(self, llm: LLMClient) -> None:
+        self.llm = llm
+        self.poll_interval_s = float(os.getenv("JOB_POLL_INTERVAL_S", "10"))
+        self.max_running = int(os.getenv("JOB_MAX_RUNNING", "4"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        # Long enough for a full retry cycle; a crashed worker's jobs are retaken after this
+        self.lease_s = float(os.getenv(
+            "JOB_LEASE_S", str(llm.read_timeout * (llm.retries + 1) + 60)
+        ))
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        self._running: Set[asyncio.Task] = set()
+        self._poller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # -------- lifecycle --------
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._poller = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        try:
+            released = await asyncio.to_thread(self._release)
+            if released:
+                print(f" Re-queued {released} unfinished LLM job(s) for the next worker")
+        except Exception as e:
+            print(f"[WARN] Could not re-queue LLM jobs on shutdown: {e}")
+
+    def _release(self) -> int:
+        db = SessionLocal()
+        try:
+            return crud.release_llm_jobs(db, worker_id=self.worker_id)
+        finally:
+            db.close()
+
+    def kick(self) -> None:
+        """Wake the poll loop right away (called after a submit)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    # -------- submit --------
+
+    def submit(self, db, usercode: str, payload: dict) -> models.LLMJob:
+        session_no = user_cache.session_count(db, usercode) + 1
+        job = crud.create_llm_job(db, kind=self.kind, usercode=usercode, session_no=session_no, payload=payload)
+        self.kick()
+        return job
+
+    # -------- worker --------
+
+    # DB work runs in a worker thread (asyncio.to_thread) so it never blocks the event loop.
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self._claim_and_spawn()
+            except Exception as e:
+                print(f"[WARN] LLM job poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _claim(self, limit: int) -> List[str]:
+        db = SessionLocal()
+        try:
+            return [
+                job_id for job_id in crud.claimable_llm_job_ids(db, limit=limit)
+                if crud.claim_llm_job(db, job_id, worker_id=self.worker_id, lease_s=self.lease_s)
+            ]
+        finally:
+            db.close()
+
+    async def _claim_and_spawn(self) -> None:
+        free = self.max_running - len(self._running)
+        if free <= 0:
+            return
+        for job_id in await asyncio.to_thread(self._claim, free):
+            task = asyncio.create_task(self._run(job_id))
+            self._running.add(task)
+            task.add_done_callback(self._job_done)
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self.kick()     # a slot freed up
+
+    def _load(self, job_id: str) -> Tuple[str, dict, int]:
+        db = SessionLocal()
+        try:
+            job = crud.get_llm_job(db, job_id)
+            return job.usercode, json.loads(job.payload), job.attempts
+        finally:
+            db.close()
+
+    def _fail(self, job_id: str, attempts: int, error: Exception) -> str:
+        status = "failed" if attempts >= self.max_attempts else "queued"
+        retry_after_s = getattr(error, "retry_after", None) or self.llm.backoff_s * (2 ** attempts)
+        db = SessionLocal()
+        try:
+            crud.finish_llm_job(
+                db, job_id, status=status, error=str(error) or type(error).__name__,
+                retry_after_s=retry_after_s if status == "queued" else None,
+                worker_id=self.worker_id,
+            )
+        finally:
+            db.close()
+        return status
+
+    def _complete(self, job_id: str, feedback: str) -> None:
+        db = SessionLocal()
+        try:
+            job = crud.get_llm_job(db, job_id)
+            # If the participant already submitted this session, tag the row directly;
+            # otherwise leave it at 0 for submit_survey to retro-tag
+            user = db.query(models.User).filter(models.User.usercode == job.usercode).first()
+            submitted = user is not None and (user.session_count or 0) >= job.session_no
+            # Feedback row and "done" commit together: a crash in between can't leave a row
+            # behind for the job to be retried and write a second one
+            rec = crud.add_user_feedback(
+                db,
+                usercode=job.usercode,
+                question_id=0,
+                feedback_text=feedback,
+                feedback_type="final",
+                session_no=job.session_no if submitted else 0,
+            )
+            if not crud.finish_llm_job(
+                db, job_id, status="done", result_text=feedback, feedback_id=rec.id, worker_id=self.worker_id,
+            ):
+                print(f"[WARN] LLM job {job_id} was taken over by another worker; dropped this result")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            usercode, payload, attempts = await asyncio.to_thread(self._load, job_id)
+            try:
+                data, _latency = await self.llm.final_feedback(payload, usercode=usercode)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status = await asyncio.to_thread(self._fail, job_id, attempts, e)
+                print(f"[WARN] LLM job {job_id} attempt {attempts} failed ({status}): {e}")
+                return
+            await asyncio.to_thread(self._complete, job_id, data.get("output", ""))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] LLM job {job_id} could not be completed: {e}")
@@ -0,0 +1,88 @@
+"""
+Client-side load balancing over several LLM backends (e.g. one SSH tunnel per Puhti GPU node).
+Requests go to the backend with the fewest outstanding requests (or best latency EWMA);
+backends that keep failing are ejected for a while and re-admitted afterwards.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+class LLMBackend:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.ewma_latency_s: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "status": "ejected" if self.is_ejected(now) else "active",
+            "outstanding": self.outstanding,
+            "ewma_latency_ms": int(self.ewma_latency_s * 1000) if self.ewma_latency_s is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for_s": max(0, int(self.ejected_until - now)),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+class BackendPool:
+    def __init__(self, base_urls: str) -> None:
+        urls = [u.strip() for u in base_urls.split(",") if u.strip()]
+        self.backends: List[LLMBackend] = [LLMBackend(u) for u in urls or ["http://127.0.0.1:8003"]]
+        self.policy = os.getenv("LLM_LB_POLICY", "least_outstanding")      # least_outstanding | ewma
+        self.eject_failures = int(os.getenv("LLM_LB_EJECT_FAILURES", "3"))
+        self.eject_s = float(os.getenv("LLM_LB_EJECT_S", "30"))
+        self.ewma_alpha = float(os.getenv("LLM_LB_EWMA_ALPHA", "0.3"))
+
+    def _score(self, backend: LLMBackend) -> tuple:
+        if self.policy == "ewma":
+            # Unknown latency sorts first so new / re-admitted backends get traffic
+            latency = backend.ewma_latency_s if backend.ewma_latency_s is not None else 0.0
+            return ((backend.outstanding + 1) * latency, backend.outstanding)
+        return (backend.outstanding, backend.ewma_latency_s or 0.0)
+
+    def pick(self) -> LLMBackend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if not b.is_ejected(now)]
+        if not candidates:
+            # Everything is ejected: try the one that is due back first rather than failing outright
+            return min(self.backends, key=lambda b: b.ejected_until)
+        return min(candidates, key=self._score)
+
+    def begin(self, backend: LLMBackend) -> None:
+        backend.outstanding += 1
+        backend.requests += 1
+
+    def end(self, backend: LLMBackend, latency_s: Optional[float], failed: Optional[bool]) -> None:
+        """failed=None: no outcome (the call was cancelled), so failure and ejection state stay as they are."""
+        backend.outstanding -= 1
+        if failed is None:
+            return
+        if failed:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.eject_failures:
+                if not backend.is_ejected(time.monotonic()):
+                    backend.ejections += 1
+                    print(f"[WARN] Ejecting LLM backend {backend.url} for {self.eject_s:.0f}s after {backend.consecutive_failures} failures")
+                backend.ejected_until = time.monotonic() + self.eject_s
+            return
+        backend.consecutive_failures = 0
+        backend.ejected_until = 0.0
+        if latency_s is not None:
+            prev = backend.ewma_latency_s
+            backend.ewma_latency_s = latency_s if prev is None else (1 - self.ewma_alpha) * prev + self.ewma_alpha * latency_s
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
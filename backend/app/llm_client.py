@@ -1,15 +1,49 @@
+import asyncio
+import json
 import os
 import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import httpx
+from .llm_balancer import BackendPool, LLMBackend
+from .llm_guard import AdaptiveLimiter, CircuitBreaker, LLMUnavailable, RetryBudget
+from .llm_scheduler import LLMScheduler
+
+def _is_backend_failure(e: Exception) -> bool:
+    """Errors that mean the LLM itself is struggling (4xx are the caller's problem)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.RequestError)
+
+def answer_feedback_payload(
+    usercode: str,
+    survey_id: Optional[str],
+    question_id: int,
+    question_text: str,
+    answer: int,
+    max_new_tokens: int,
+    temperature: float,
+) -> Dict[str, Any]:
+    """Request body for the LLM's /v1/survey/answer_feedback (shared by the API and precompute_feedback.py)."""
+    return {
+        "user_id": usercode,
+        "survey_id": survey_id,
+        "questions_and_answers": [
+            {"question_id": question_id, "question": question_text, "answer": str(answer)}
+        ],
+        "max_new_tokens": max_new_tokens,
+        "temperature": temperature,
+    }
 
 class LLMClient:
     """
     Async HTTP client with retries/backoff for the Puhti LLM APIs.
+    Owns one pooled httpx.AsyncClient for the lifetime of the app (see start()/aclose()).
+    LLM_API_BASE may list several backends (comma-separated); see llm_balancer.py.
     """
 
     def __init__(self) -> None:
         self.base_url = os.getenv("LLM_API_BASE", "http://127.0.0.1:8003")
+        self.backends = BackendPool(self.base_url)
 
         # Timeouts (seconds)
         self.connect_timeout = float(os.getenv("LLM_API_CONNECT_TIMEOUT", "10"))
@@ -21,6 +55,35 @@ class LLMClient:
         self.retries = int(os.getenv("LLM_API_RETRIES", "2"))                   # total attempts = retries + 1
         self.backoff_s = float(os.getenv("LLM_API_BACKOFF_S", "2.0"))
 
+        # Connection pool (kept open across requests so the tunnel isn't re-dialled per call)
+        self.max_connections = int(os.getenv("LLM_API_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = int(os.getenv("LLM_API_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = float(os.getenv("LLM_API_KEEPALIVE_EXPIRY", "30"))
+        self.http2 = os.getenv("LLM_API_HTTP2", "false").lower() in ("1", "true", "yes")
+
+        # Single-flight: concurrent identical POSTs share one upstream call
+        self.coalesce = os.getenv("LLM_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+        # Payload keys left out of the identity (user_id is only used for logging on the LLM side)
+        self.coalesce_ignore_keys = {
+            k.strip() for k in os.getenv("LLM_COALESCE_IGNORE_KEYS", "user_id").split(",") if k.strip()
+        }
+        # Hotter requests ask for sampling variety: each gets its own completion (0.2 is the app default)
+        self.coalesce_max_temperature = float(os.getenv("LLM_COALESCE_MAX_TEMPERATURE", "0.2"))
+
+        # Overload protection (see llm_guard.py)
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+        self.retry_budget = RetryBudget()
+        # Priority/fair-share admission in front of the upstream calls, sized by the adaptive limit
+        self.scheduler = LLMScheduler(capacity=lambda: int(self.limiter.limit))
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight = 0
+        self._pending: Dict[str, "asyncio.Task[Tuple[Dict[str, Any], int]]"] = {}
+        self.issued = 0
+        self.coalesced = 0
+        self.not_coalesced = 0     # issued on their own because the caller wanted a fresh completion
+
     def _timeout(self) -> httpx.Timeout:
         return httpx.Timeout(
             connect=self.connect_timeout,
@@ -29,75 +92,354 @@ class LLMClient:
             pool=self.pool_timeout,
         )
 
-    async def _healthz_quiet(self, client: httpx.AsyncClient) -> bool:
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    # -------- Lifecycle --------
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx only needs it importable)
+            except ImportError:
+                print("[WARN] LLM_API_HTTP2 is set but the 'h2' package is missing; falling back to HTTP/1.1 (pip install 'httpx[http2]')")
+                http2 = False
+        return httpx.AsyncClient(timeout=self._timeout(), limits=self._limits(), http2=http2)
+
+    async def start(self) -> None:
+        """Open the shared client (called from FastAPI startup)."""
+        if self._client is None:
+            self._client = self._build_client()
+
+    async def aclose(self) -> None:
+        """Close the shared client and its pooled connections (called from FastAPI shutdown)."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Lazily open if used outside the app lifecycle (scripts, tests)
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of the shared connection pool: open/idle/active connections and
+        requests waiting for a free connection.
+        """
+        stats: Dict[str, Any] = {
+            "started": self._client is not None,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "in_flight": self._in_flight,
+            "open": 0,
+            "idle": 0,
+            "active": 0,
+            "waiting": 0,
+        }
+        # httpx does not expose pool state publicly; read it from the httpcore pool underneath
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+            idle = sum(1 for c in connections if c.is_idle())
+            stats["open"] = len(connections)
+            stats["idle"] = idle
+            stats["active"] = len(connections) - idle
+            stats["waiting"] = sum(1 for r in list(getattr(pool, "_requests", [])) if r.is_queued())
+        return stats
+
+    def coalesce_stats(self) -> Dict[str, Any]:
+        total = self.issued + self.coalesced
+        return {
+            "enabled": self.coalesce,
+            "ignore_keys": sorted(self.coalesce_ignore_keys),
+            "max_temperature": self.coalesce_max_temperature,
+            "not_coalesced": self.not_coalesced,
+            "issued": self.issued,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+            "pending_keys": len(self._pending),
+        }
+
+    def guard_stats(self) -> Dict[str, Any]:
+        return {
+            "limiter": self.limiter.stats(),
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+            "backends": self.backends.stats(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+    # -------- Single-flight coalescing --------
+
+    def _coalesce_key(self, path: str, payload: Dict[str, Any]) -> str:
+        normalized = {k: v for k, v in payload.items() if k not in self.coalesce_ignore_keys}
+        return path + " " + json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+
+    def _may_coalesce(self, payload: Dict[str, Any]) -> bool:
+        temperature = payload.get("temperature")
+        return temperature is None or float(temperature) <= self.coalesce_max_temperature
+
+    async def _post(
+        self, path: str, payload: Dict[str, Any], usercode: Optional[str] = None, coalesce: bool = True
+    ) -> Tuple[Dict[str, Any], int]:
+        """coalesce=False (e.g. the caller bypassed the response cache) always issues its own call."""
+        if not self.coalesce or not coalesce or not self._may_coalesce(payload):
+            self.issued += 1
+            if self.coalesce:
+                self.not_coalesced += 1
+            return await self._scheduled_post(path, payload, usercode)
+
+        key = self._coalesce_key(path, payload)
+        task = self._pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.issued += 1
+            # Only the leader queues in the scheduler; followers just wait for its result
+            task = asyncio.ensure_future(self._scheduled_post(path, payload, usercode))
+            self._pending[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish_pending(key, t))
+        # shield: one caller disconnecting must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _finish_pending(self, key: str, task: "asyncio.Task") -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def _scheduled_post(self, path: str, payload: Dict[str, Any], usercode: Optional[str]) -> Tuple[Dict[str, Any], int]:
+        await self.scheduler.acquire(path, usercode)
         try:
-            r = await client.get(f"{self.base_url}/healthz")
+            return await self._post_upstream(path, payload)
+        finally:
+            self.scheduler.release()
+
+    # -------- Transport with retries --------
+
+    async def _healthz_quiet(self, client: httpx.AsyncClient, backend: LLMBackend) -> bool:
+        try:
+            r = await client.get(f"{backend.url}/healthz")
             r.raise_for_status()
             return True
         except Exception:
             return False
 
-    async def _post(self, path: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
-        url = f"{self.base_url}{path}"
+    async def _admit(self) -> Tuple[LLMBackend, bool]:
+        """
+        Fail fast while the breaker is open, otherwise wait for a slot under the adaptive limit
+        and pick the backend for this attempt. Also returns whether this attempt is the breaker's probe.
+        """
+        probe = self.breaker.before_call()
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release_probe(probe)
+            raise
+        backend = self.backends.pick()
+        self.backends.begin(backend)
+        return backend, probe
+
+    def _record(
+        self,
+        backend: LLMBackend,
+        probe: bool,
+        t_attempt: float,
+        error: Optional[BaseException],
+        sample_latency: bool = True,
+    ) -> None:
+        """Release the limiter slot and feed the attempt's outcome to balancer, limiter and breaker."""
+        if error is not None and not isinstance(error, Exception):
+            # cancelled / client went away: no signal about backend health
+            self.backends.end(backend, None, failed=None)
+            self.limiter.release(None, ok=True)
+            self.breaker.release_probe(probe)
+            return
+        failed = error is not None and _is_backend_failure(error)
+        latency_s = time.perf_counter() - t_attempt if error is None and sample_latency else None
+        self.backends.end(backend, latency_s, failed=failed)
+        self.limiter.release(latency_s, ok=not failed)
+        if failed:
+            self.breaker.record_failure(probe)
+        else:
+            self.breaker.record_success(probe)
+
+    async def _post_upstream(self, path: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
         attempt = 0
         t0 = time.perf_counter()
-        last_exc: Optional[Exception] = None
+        client = self._get_client()
+        self.retry_budget.deposit()
 
-        async with httpx.AsyncClient(timeout=self._timeout()) as client:
+        self._in_flight += 1
+        try:
             while True:
+                # Each attempt re-picks, so a retry naturally moves off a failing backend
+                backend, probe = await self._admit()
+                t_attempt = time.perf_counter()
                 try:
-                    r = await client.post(url, json=payload)
+                    r = await client.post(f"{backend.url}{path}", json=payload)
                     r.raise_for_status()
-                    latency_ms = int((time.perf_counter() - t0) * 1000)
-                    return r.json(), latency_ms
                 except (httpx.ReadTimeout, httpx.RequestError, httpx.HTTPStatusError) as e:
-                    last_exc = e
-                    if attempt >= self.retries:
+                    self._record(backend, probe, t_attempt, e)
+                    # Retries come out of a shared budget so they cannot multiply load during an outage
+                    if attempt >= self.retries or not self.retry_budget.try_withdraw():
                         raise
                     # If it's a ReadTimeout during warmup, try a quick health probe
                     if isinstance(e, httpx.ReadTimeout):
-                        await self._healthz_quiet(client)
+                        await self._healthz_quiet(client, backend)
 
                     backoff = self.backoff_s * (2 ** attempt)
                     await asyncio.sleep(backoff)
                     attempt += 1
+                    continue
+                except BaseException as e:
+                    self._record(backend, probe, t_attempt, e)
+                    raise
+                self._record(backend, probe, t_attempt, None)
+                latency_ms = int((time.perf_counter() - t0) * 1000)
+                data = r.json()
+                data.setdefault("backend_url", backend.url)
+                return data, latency_ms
+        finally:
+            self._in_flight -= 1
 
-    async def _get(self, path: str) -> Dict[str, Any]:
-        url = f"{self.base_url}{path}"
+    async def _get(self, backend: LLMBackend, path: str, retries: Optional[int] = None) -> Dict[str, Any]:
+        url = f"{backend.url}{path}"
         attempt = 0
+        retries = self.retries if retries is None else retries
+        client = self._get_client()
 
-        async with httpx.AsyncClient(timeout=self._timeout()) as client:
+        self._in_flight += 1
+        try:
             while True:
                 try:
                     r = await client.get(url)
                     r.raise_for_status()
                     return r.json()
                 except (httpx.ReadTimeout, httpx.RequestError, httpx.HTTPStatusError) as e:
-                    if attempt >= self.retries:
+                    if attempt >= retries:
                         raise
                     if isinstance(e, httpx.ReadTimeout):
-                        await self._healthz_quiet(client)
+                        await self._healthz_quiet(client, backend)
                     backoff = self.backoff_s * (2 ** attempt)
                     await asyncio.sleep(backoff)
                     attempt += 1
-        
+        finally:
+            self._in_flight -= 1
+
+    async def _stream(self, path: str, payload: Dict[str, Any], usercode: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST with "stream": true and yield events as the LLM produces them:
+        {"token": str} per chunk, then one {"done": True, ...metadata}.
+        Accepts SSE ("data: {...}") and NDJSON lines; a plain JSON body (backend
+        without streaming support) is yielded as a single token.
+        No retries here: once tokens have been forwarded a replay would duplicate them.
+        """
+        client = self._get_client()
+
+        await self.scheduler.acquire(path, usercode)
+        try:
+            backend, probe = await self._admit()
+        except BaseException:
+            self.scheduler.release()
+            raise
+        t_attempt = time.perf_counter()
+        error: Optional[BaseException] = None
+        self._in_flight += 1
+        try:
+            async with client.stream("POST", f"{backend.url}{path}", json={**payload, "stream": True}) as r:
+                r.raise_for_status()
+                if r.headers.get("content-type", "").startswith("application/json"):
+                    data = json.loads(await r.aread())
+                    yield {"token": data.get("output", "")}
+                    yield {**data, "backend_url": backend.url, "done": True}
+                    return
+
+                meta: Dict[str, Any] = {}
+                async for line in r.aiter_lines():
+                    line = line.strip()
+                    if not line or line.startswith(":") or line.startswith("event:"):
+                        continue
+                    if line.startswith("data:"):
+                        line = line[len("data:"):].strip()
+                    if line == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        yield {"token": line}
+                        continue
+                    token = event.get("token") or event.get("text") or event.get("delta") or ""
+                    if token:
+                        yield {"token": token}
+                    if event.get("done"):
+                        meta = event
+                        break
+                yield {**meta, "backend_url": backend.url, "done": True}
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._in_flight -= 1
+            # Stream duration depends on reply length, so it is not used as a latency sample
+            self._record(backend, probe, t_attempt, error, sample_latency=False)
+            self.scheduler.release()
+
     # -------- Public methods mapping to your LLM API --------
 
     async def healthz(self) -> Dict[str, Any]:
-        return await self._get("/healthz")
+        """First healthy backend's /healthz payload; raises the last error if none is healthy."""
+        last_exc: Optional[Exception] = None
+        for backend in self.backends.backends:
+            try:
+                return await self._get(backend, "/healthz")
+            except Exception as e:
+                last_exc = e
+        assert last_exc is not None
+        raise last_exc
+
+    async def healthz_all(self) -> List[Dict[str, Any]]:
+        """Probe every backend once (no retries) and merge in its routing stats."""
+        async def probe(backend: LLMBackend) -> Dict[str, Any]:
+            status = backend.stats()
+            try:
+                status["health"] = await self._get(backend, "/healthz", retries=0)
+                status["healthy"] = True
+            except Exception as e:
+                status["health"] = None
+                status["healthy"] = False
+                status["error"] = str(e) or type(e).__name__
+            return status
 
-    async def generate(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        return list(await asyncio.gather(*(probe(b) for b in self.backends.backends)))
+
+    async def generate(self, payload: Dict[str, Any], usercode: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
         # maps to /v1/generate on LLM
-        return await self._post("/v1/generate", payload)
+        return await self._post("/v1/generate", payload, usercode)
 
-    async def chat(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    async def chat(self, payload: Dict[str, Any], usercode: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
         # maps to /v1/chat on LLM
-        return await self._post("/v1/chat", payload)
+        return await self._post("/v1/chat", payload, usercode)
+
+    def chat_stream(self, payload: Dict[str, Any], usercode: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        # maps to /v1/chat on LLM with "stream": true
+        return self._stream("/v1/chat", payload, usercode)
 
-    async def answer_feedback(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
-        # maps to /v1/survey/answer_feedback on LLM
-        return await self._post("/v1/survey/answer_feedback", payload)
+    async def answer_feedback(
+        self, payload: Dict[str, Any], usercode: Optional[str] = None, coalesce: bool = True
+    ) -> Tuple[Dict[str, Any], int]:
+        # maps to /v1/survey/answer_feedback on LLM; coalesce=False when the caller wants a fresh sample
+        return await self._post("/v1/survey/answer_feedback", payload, usercode, coalesce=coalesce)
 
-    async def final_feedback(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    async def final_feedback(self, payload: Dict[str, Any], usercode: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
         # maps to /v1/survey/final_feedback on LLM
-        return await self._post("/v1/survey/final_feedback", payload)
+        return await self._post("/v1/survey/final_feedback", payload, usercode)
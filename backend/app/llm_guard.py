@@ -0,0 +1,215 @@
+"""
+Overload protection for the LLM backend: an AIMD adaptive concurrency limit,
+a circuit breaker and a retry budget. Used by LLMClient around every upstream call.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+class LLMUnavailable(Exception):
+    """Raised instead of calling the LLM when it is known to be unhealthy or saturated (-> 503)."""
+
+    status_code = 503
+
+    def __init__(self, detail: str, retry_after: float = 5.0, hints: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, int(round(retry_after)))
+        self.hints = hints or {}
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: +1/limit per successful call that saw the limit in use,
+    multiplicative decrease on errors or when latency exceeds tolerance x the EWMA baseline.
+    """
+
+    def __init__(self) -> None:
+        self.limit = float(os.getenv("LLM_LIMIT_INITIAL", "4"))
+        self.min_limit = float(os.getenv("LLM_LIMIT_MIN", "1"))
+        self.max_limit = float(os.getenv("LLM_LIMIT_MAX", "32"))
+        self.backoff_ratio = float(os.getenv("LLM_LIMIT_BACKOFF_RATIO", "0.75"))
+        self.latency_tolerance = float(os.getenv("LLM_LIMIT_LATENCY_TOLERANCE", "2.0"))
+        self.queue_timeout_s = float(os.getenv("LLM_LIMIT_QUEUE_TIMEOUT_S", "30"))
+
+        self.in_flight = 0
+        self.rejected = 0
+        self.baseline_latency_s: Optional[float] = None
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < max(int(self.limit), 1)
+
+    def _wake(self) -> None:
+        # Hand free slots to waiters in FIFO order
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> None:
+        if self._has_room() and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout_s)
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we timed out / got cancelled: give it back
+                self.in_flight -= 1
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise LLMUnavailable("LLM backend is saturated; please retry.", retry_after=self.queue_timeout_s / 2) from None
+            raise
+
+    def release(self, latency_s: Optional[float], ok: bool) -> None:
+        """Return a slot; latency_s=None means no latency sample (errors, cancellations, streams)."""
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+
+        if not ok:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif latency_s is not None:
+            baseline = self.baseline_latency_s
+            if baseline is not None and latency_s > baseline * self.latency_tolerance:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            # Slow EWMA so the baseline tracks the no-load latency, not the overload spike
+            self.baseline_latency_s = latency_s if baseline is None else 0.95 * baseline + 0.05 * latency_s
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+            "baseline_latency_ms": int(self.baseline_latency_s * 1000) if self.baseline_latency_s is not None else None,
+        }
+
+class CircuitBreaker:
+    """
+    closed -> open after N consecutive failures; open -> half_open after the cooldown,
+    where a single probe call decides between closed and open again.
+    before_call() tells the caller whether its call is that probe; the caller passes the
+    flag back, so calls admitted earlier that finish late can't close the breaker or free the probe.
+    """
+
+    def __init__(self) -> None:
+        self.failure_threshold = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        self.cooldown_s = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """Raise LLMUnavailable if the call may not go out; True if it is the half-open probe."""
+        if self.state == "open":
+            remaining = self.cooldown_s - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                self.rejected += 1
+                raise LLMUnavailable("LLM backend is unhealthy; please retry later.", retry_after=remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise LLMUnavailable("LLM backend is recovering; please retry shortly.", retry_after=self.cooldown_s / 4)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, probe: bool) -> None:
+        if probe:
+            self._probe_in_flight = False
+            self.state = "closed"
+        elif self.state != "closed":
+            return      # admitted before the breaker opened; only the probe decides now
+        self.consecutive_failures = 0
+
+    def release_probe(self, probe: bool) -> None:
+        """The call was abandoned (client went away) before we learned anything."""
+        if probe:
+            self._probe_in_flight = False
+
+    def record_failure(self, probe: bool) -> None:
+        if probe:
+            self._probe_in_flight = False
+        elif self.state != "closed":
+            return      # already open (or probing); a late failure changes nothing
+        self.consecutive_failures += 1
+        if probe or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"[WARN] LLM circuit breaker opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = None
+        if self.state == "open":
+            retry_after = max(0, int(self.cooldown_s - (time.monotonic() - self.opened_at)))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_s": self.cooldown_s,
+            "retry_after_s": retry_after,
+            "rejected": self.rejected,
+        }
+
+class RetryBudget:
+    """
+    Token bucket shared by all callers: every request deposits `ratio` tokens and
+    every retry withdraws one, so retries stay a bounded fraction of traffic.
+    """
+
+    def __init__(self) -> None:
+        self.ratio = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+        self.min_per_s = float(os.getenv("LLM_RETRY_BUDGET_MIN_PER_S", "0.1"))  # trickle so idle apps can still retry
+        self.max_tokens = float(os.getenv("LLM_RETRY_BUDGET_MAX", "10"))
+
+        self.tokens = self.max_tokens
+        self.allowed = 0
+        self.denied = 0
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last) * self.min_per_s)
+        self._last = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            self.allowed += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "tokens": round(self.tokens, 2),
+            "ratio": self.ratio,
+            "max_tokens": self.max_tokens,
+            "retries_allowed": self.allowed,
+            "retries_denied": self.denied,
+        }
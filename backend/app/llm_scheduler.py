@@ -0,0 +1,217 @@
+"""
+Priority scheduler and admission control for LLM work.
+Requests are dispatched by endpoint priority class, round-robin across usercodes
+within a class, and only while the adaptive concurrency limit has room. The
+queue is bounded: when it is full, lower-priority work is shed first and the
+caller gets a 429 with queue-position hints.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .llm_guard import LLMUnavailable
+
+# LLM API path -> priority class name
+ENDPOINT_CLASSES = {
+    "/v1/survey/final_feedback": "final_feedback",
+    "/v1/survey/answer_feedback": "answer_feedback",
+    "/v1/chat": "chat",
+    "/v1/generate": "generate",
+}
+
+class LLMQueueFull(LLMUnavailable):
+    """Admission rejected because the scheduler queue (or the participant's share of it) is full (-> 429)."""
+
+    status_code = 429
+
+class _Ticket:
+    __slots__ = ("future", "priority", "user_key", "enqueued_at")
+
+    def __init__(self, future: "asyncio.Future[None]", priority: int, user_key: str) -> None:
+        self.future = future
+        self.priority = priority
+        self.user_key = user_key
+        self.enqueued_at = time.monotonic()
+
+def _parse_priorities(spec: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for item in spec.split(","):
+        if ":" in item:
+            name, prio = item.split(":", 1)
+            out[name.strip()] = int(prio)
+    return out
+
+class LLMScheduler:
+    def __init__(self, capacity: Callable[[], int]) -> None:
+        # Lower number = served first
+        self.priorities = _parse_priorities(
+            os.getenv("LLM_SCHED_PRIORITIES", "final_feedback:0,answer_feedback:1,chat:2,generate:3")
+        )
+        self.default_priority = max(self.priorities.values(), default=0)
+        self.max_queue = int(os.getenv("LLM_SCHED_MAX_QUEUE", "200"))
+        self.max_queued_per_user = int(os.getenv("LLM_SCHED_MAX_QUEUED_PER_USER", "3"))
+        self.queue_timeout_s = float(os.getenv("LLM_SCHED_QUEUE_TIMEOUT_S", "60"))
+
+        self._capacity = capacity
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Ticket]]"] = {}
+        self._queued = 0
+        self._queued_per_user: Dict[str, int] = {}
+        self._anon = itertools.count()
+        self.active = 0
+        self.dispatched = 0
+        self.rejected = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._wait_ewma_s = 0.0
+
+    def priority_of(self, path: str) -> int:
+        return self.priorities.get(ENDPOINT_CLASSES.get(path, ""), self.default_priority)
+
+    def _class_name(self, priority: int) -> str:
+        names = [n for n, p in self.priorities.items() if p == priority]
+        return "/".join(names) or f"p{priority}"
+
+    # -------- queue bookkeeping --------
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        users = self._queues.setdefault(ticket.priority, OrderedDict())
+        users.setdefault(ticket.user_key, deque()).append(ticket)
+        self._queued += 1
+        self._queued_per_user[ticket.user_key] = self._queued_per_user.get(ticket.user_key, 0) + 1
+
+    def _forget(self, ticket: _Ticket) -> bool:
+        users = self._queues.get(ticket.priority, {})
+        waiters = users.get(ticket.user_key)
+        if not waiters or ticket not in waiters:
+            return False
+        waiters.remove(ticket)
+        if not waiters:
+            del users[ticket.user_key]
+        self._queued -= 1
+        left = self._queued_per_user.get(ticket.user_key, 1) - 1
+        if left:
+            self._queued_per_user[ticket.user_key] = left
+        else:
+            self._queued_per_user.pop(ticket.user_key, None)
+        return True
+
+    def _position(self, priority: int) -> int:
+        """Requests that would be served before a new arrival of this priority."""
+        return sum(
+            len(waiters)
+            for prio, users in self._queues.items() if prio <= priority
+            for waiters in users.values()
+        )
+
+    def _retry_after(self, position: int) -> float:
+        # Rough drain estimate from recent queue waits and current capacity
+        per_slot = max(self._wait_ewma_s, 1.0)
+        return per_slot * (position + 1) / max(self._capacity(), 1)
+
+    def _dispatch(self) -> None:
+        while self._queued and self.active < max(self._capacity(), 1):
+            priority = min(p for p, users in self._queues.items() if users)
+            users = self._queues[priority]
+            # Round-robin across participants: take the head user's oldest request, rotate them to the back
+            user_key, waiters = next(iter(users.items()))
+            ticket = waiters[0]
+            self._forget(ticket)
+            if user_key in users:
+                users.move_to_end(user_key)
+            if ticket.future.done():
+                continue
+            self.active += 1
+            self.dispatched += 1
+            waited = time.monotonic() - ticket.enqueued_at
+            self._wait_ewma_s = 0.8 * self._wait_ewma_s + 0.2 * waited
+            ticket.future.set_result(None)
+
+    def _shed_for(self, priority: int) -> bool:
+        """Drop the newest request of the lowest class below `priority` to make room; False if none."""
+        lower = [p for p, users in self._queues.items() if users and p > priority]
+        if not lower:
+            return False
+        users = self._queues[max(lower)]
+        victim = max((w[-1] for w in users.values()), key=lambda t: t.enqueued_at)
+        self._forget(victim)
+        self.shed += 1
+        position = self._position(victim.priority)
+        victim.future.set_exception(LLMQueueFull(
+            "LLM queue is full; your request was deferred for higher-priority work. Please retry.",
+            retry_after=self._retry_after(position),
+            hints={"queue_length": self._queued, "queue_position": position + 1},
+        ))
+        return True
+
+    # -------- public API --------
+
+    async def acquire(self, path: str, usercode: Optional[str]) -> None:
+        priority = self.priority_of(path)
+        user_key = usercode or f"anon-{next(self._anon)}"
+
+        if not self._queued and self.active < max(self._capacity(), 1):
+            self.active += 1
+            self.dispatched += 1
+            return
+
+        if self._queued_per_user.get(user_key, 0) >= self.max_queued_per_user:
+            self.rejected += 1
+            raise LLMQueueFull(
+                "Too many pending LLM requests for this participant; please wait for the previous ones.",
+                retry_after=self._retry_after(self._position(priority)),
+                hints={"queued_for_user": self._queued_per_user[user_key]},
+            )
+        if self._queued >= self.max_queue and not self._shed_for(priority):
+            self.rejected += 1
+            position = self._position(priority)
+            raise LLMQueueFull(
+                "LLM queue is full; please retry.",
+                retry_after=self._retry_after(position),
+                hints={"queue_length": self._queued, "queue_position": position + 1},
+            )
+
+        ticket = _Ticket(asyncio.get_running_loop().create_future(), priority, user_key)
+        self._enqueue(ticket)
+        try:
+            await asyncio.wait_for(ticket.future, self.queue_timeout_s)
+        except BaseException as e:
+            if not self._forget(ticket) and ticket.future.done() and not ticket.future.cancelled() \
+                    and ticket.future.exception() is None:
+                # Dispatched just as we gave up: hand the slot on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise LLMUnavailable("Timed out waiting for the LLM queue; please retry.", retry_after=self._retry_after(self._queued)) from None
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        classes: List[Dict[str, Any]] = []
+        for priority in sorted(set(self.priorities.values()) | set(self._queues)):
+            users = self._queues.get(priority, {})
+            classes.append({
+                "priority": priority,
+                "class": self._class_name(priority),
+                "queued": sum(len(w) for w in users.values()),
+                "users_waiting": len(users),
+            })
+        return {
+            "capacity": max(self._capacity(), 1),
+            "active": self.active,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "max_queued_per_user": self.max_queued_per_user,
+            "dispatched": self.dispatched,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_queue_wait_ms": int(self._wait_ewma_s * 1000),
+            "classes": classes,
+        }
@@ -1,22 +1,42 @@
-import random
-import string
 import asyncio
+import json
+import time
 import httpx
 from datetime import datetime
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from .database import engine, get_db, test_connection
+from sqlalchemy.exc import IntegrityError
+from .database import Base, engine, is_memory_database, get_db, get_async_db, test_connection, SessionLocal, AsyncSessionLocal
 from .question_manager import question_manager
 from . import models, schemas, crud
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import os
-from .llm_client import LLMClient
+from .llm_client import LLMClient, answer_feedback_payload
+from .llm_guard import LLMUnavailable
+from .feedback_cache import feedback_cache
+from .user_cache import user_cache
+from .usercode_pool import generate_usercode, usercode_pool
+from .feedback_corpus import feedback_corpus
+from .jobs import FinalFeedbackJobRunner
+from .health import HealthMonitor
+from .write_behind import write_behind
+from .pool_metrics import POOL_METRICS
+from .replicas import get_read_db, read_router
+from .export import EXPORT_FORMATS, chunked, export_lines
 
 LLM_ENDPOINT_DISPLAY = os.getenv("LLM_API_BASE", "http://127.0.0.1:8003")
 _llm = LLMClient()
+_final_feedback_jobs = FinalFeedbackJobRunner(_llm)
+_health = HealthMonitor(_llm)
+
+# Idempotency keys for /submit_survey are kept this long, then purged in the background
+SUBMISSION_KEY_TTL_S = float(os.getenv("SUBMISSION_KEY_TTL_H", "48")) * 3600
+SUBMISSION_KEY_PURGE_INTERVAL_S = float(os.getenv("SUBMISSION_KEY_PURGE_INTERVAL_S", "3600"))
 
 app = FastAPI()
 
@@ -33,13 +53,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request, exc: LLMUnavailable):
+    # Circuit open, limiter saturated (503) or scheduler queue full (429): fail fast and tell the client when to come back
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, **exc.hints},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.get("/")
 def read_root():
     return {"message": "Backend is running with CORS enabled"}
 
-# Startup: DB ping + sync questions
-@app.on_event("startup")
-async def startup_event():
+@app.get("/livez")
+def livez():
+    """Process is up and serving; says nothing about dependencies."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz(require_llm: bool = Query(default=False)):
+    """
+    Cached DB and LLM readiness from the background monitor.
+    Ready (200) when the DB is reachable; pass require_llm=true to also require a healthy LLM.
+    """
+    snapshot = _health.snapshot()
+    ready = snapshot["db"]["ready"] and (snapshot["llm"]["ready"] or not require_llm)
+    body = {"status": "ready" if ready else "not_ready", **snapshot}
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+def _init_database():
+    """DB ping + question sync. Runs in a worker thread so startup does not wait on MySQL."""
     print("🔌 Testing database connection...")
     if not test_connection():
         print("⚠️  Warning: Database connection failed. Some features may not work.")
@@ -49,7 +95,6 @@ async def startup_event():
     # Ensure tables exist before syncing questions
     try:
         print("🔧 Checking database tables...")
-        from .database import SessionLocal
         db = SessionLocal()
         try:
             db.query(models.Question).first()
@@ -66,28 +111,58 @@ async def startup_event():
     except Exception as e:
         print(f"  Startup warning: {e}")
 
-    # --- Gate readiness on LLM health ---
-    llm_health_retries = int(os.getenv("LLM_HEALTH_RETRIES", "24"))  # ~2 minutes at 5s intervals
-    llm_health_interval = float(os.getenv("LLM_HEALTH_INTERVAL", "5.0"))
+def _purge_submission_keys() -> int:
+    db = SessionLocal()
+    try:
+        return crud.purge_submission_keys(db, ttl_s=SUBMISSION_KEY_TTL_S)
+    finally:
+        db.close()
 
-    print("🔎 Probing LLM health…")
-    healthy = False
-    for attempt in range(1, llm_health_retries + 1):
+async def _purge_submission_keys_loop():
+    while True:
+        await asyncio.sleep(SUBMISSION_KEY_PURGE_INTERVAL_S)
         try:
-            out = await _llm.healthz()
-            print(f" ✅ LLM healthy on attempt {attempt}: {out}")
-            healthy = True
-            break
+            purged = await asyncio.to_thread(_purge_submission_keys)
+            if purged:
+                print(f" Purged {purged} expired submission key(s)")
         except Exception as e:
-            print(f" ⏳ LLM not ready yet (attempt {attempt}/{llm_health_retries}): {e}")
-            await asyncio.sleep(llm_health_interval)
+            print(f"[WARN] Submission key cleanup failed: {e}")
 
-    if not healthy:
-        raise RuntimeError("LLM backend not healthy after startup retries. Aborting startup.")
+_background_tasks = set()
 
-def generate_usercode(length=8):
-    characters = string.ascii_uppercase + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
+# Startup: returns immediately; DB init and LLM health run in the background (see /readyz)
+@app.on_event("startup")
+async def startup_event():
+    # An in-memory SQLite database (DATABASE_URL=sqlite://) starts empty: create the schema before serving
+    if is_memory_database(engine.url):
+        Base.metadata.create_all(bind=engine)
+        print(" Created tables in the in-memory SQLite database")
+    # Open the shared LLM connection pool first; it lives until shutdown
+    await _llm.start()
+    # Resume persisted final-feedback jobs (queued, or orphaned by a previous worker)
+    await _final_feedback_jobs.start()
+    # Continuous DB / LLM probes; the LLM may still be warming up, which only affects /v1/* endpoints
+    await _health.start()
+    # Batched chat/feedback inserts (WRITE_BEHIND_ENABLED); re-queues rows spilled at the last shutdown
+    await write_behind.start()
+    # Pre-generated usercodes for /register (USERCODE_POOL_SIZE)
+    await usercode_pool.start()
+
+    for coro in (asyncio.to_thread(_init_database), _purge_submission_keys_loop()):
+        task = asyncio.create_task(coro)
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in list(_background_tasks):
+        task.cancel()
+    await _health.stop()
+    await _final_feedback_jobs.stop()
+    await write_behind.stop()
+    await usercode_pool.stop()
+    await _llm.aclose()
+    print(" LLM client pool closed")
 
 # --- Session utilities following your finalized logic ---
 
@@ -96,20 +171,22 @@ def get_current_session_no(db: Session, usercode: str) -> int:
     Latest completed session number for the user.
     If user not found or has not completed any session, returns 0.
     """
-    user = db.query(models.User).filter(models.User.usercode == usercode).first()
-    return user.session_count if user and user.session_count is not None else 0
+    return user_cache.session_count(db, usercode)
 
-def increment_session(db: Session, usercode: str) -> int:
+def increment_session(db: Session, usercode: str) -> models.User:
     """
-    Increments session_count (at survey finish) and returns the new session number.
+    Increments session_count (at survey finish) with a single atomic UPDATE and returns the user
+    with the new session number. Does NOT commit: the row stays locked until the caller's
+    transaction ends, so concurrent submits for the same user get distinct session numbers.
     """
-    user = db.query(models.User).filter(models.User.usercode == usercode).first()
-    if not user:
+    updated = db.query(models.User).filter(models.User.usercode == usercode).update(
+        {models.User.session_count: func.coalesce(models.User.session_count, 0) + 1},
+        synchronize_session=False,
+    )
+    if not updated:
         raise HTTPException(status_code=404, detail="User not found")
-    user.session_count = (user.session_count or 0) + 1
-    db.commit()
-    db.refresh(user)
-    return user.session_count
+    user_cache.invalidate_on_commit(db, usercode)
+    return db.query(models.User).filter(models.User.usercode == usercode).populate_existing().one()
 
 @app.post("/users/{usercode}/session/start")
 def start_session(usercode: str, db: Session = Depends(get_db)):
@@ -122,53 +199,84 @@ def start_session(usercode: str, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.session_start_time = datetime.utcnow()
+    user_cache.invalidate_on_commit(db, usercode)
     db.commit()
+    read_router.pin(usercode)
     db.refresh(user)
     return {"usercode": usercode, "session_start_time": user.session_start_time.isoformat()}
 
 # --- Users / Questions ---
 
+# A duplicate usercode is only possible by chance (36^8 codes), so a few attempts are plenty
+USERCODE_MAX_ATTEMPTS = int(os.getenv("USERCODE_MAX_ATTEMPTS", "5"))
+
 @app.post("/register", response_model=schemas.UserOut)
 def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    """
+    Creates a user under a new random usercode. The code is not looked up first:
+    the INSERT relies on the unique index and is retried with another code on a duplicate.
+    """
     try:
-        usercode = generate_usercode()
-        while db.query(models.User).filter(models.User.usercode == usercode).first():
-            usercode = generate_usercode()
-
-        new_user = models.User(
-            usercode=usercode,
-            age=user_data.age,
-            gender=user_data.gender,
-            country=user_data.country,
-            education=user_data.education,
-            field=user_data.field,
-            yearsOfStudy=user_data.yearsOfStudy,
-            session_count=0,               # explicit for clarity
-            session_start_time=None
-        )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        print(f" New user registered: {usercode}")
-        return new_user
+        for attempt in range(1, USERCODE_MAX_ATTEMPTS + 1):
+            usercode = usercode_pool.take()
+            new_user = models.User(
+                usercode=usercode,
+                age=user_data.age,
+                gender=user_data.gender,
+                country=user_data.country,
+                education=user_data.education,
+                field=user_data.field,
+                yearsOfStudy=user_data.yearsOfStudy,
+                session_count=0,               # explicit for clarity
+                session_start_time=None
+            )
+            db.add(new_user)
+            try:
+                db.flush()
+            except IntegrityError:
+                db.rollback()
+                print(f"[WARN] Usercode {usercode} already taken, retrying ({attempt}/{USERCODE_MAX_ATTEMPTS})")
+                continue
+            # Every column is known after the INSERT; answer from it instead of a refresh SELECT after commit
+            out = {c.key: getattr(new_user, c.key) for c in models.User.__table__.columns}
+            user_cache.invalidate_on_commit(db, usercode)
+            db.commit()
+            read_router.pin(usercode)
+            print(f" New user registered: {usercode}")
+            return out
+        raise HTTPException(status_code=503, detail="Could not allocate a usercode, please retry")
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         print(f" Error registering user: {e}")
         raise HTTPException(status_code=500, detail=f"Error registering user: {str(e)}")
 
-@app.get("/users", response_model=List[schemas.UserOut])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.User).offset(skip).limit(limit).all()
+# Listings are keyset-paginated on (created_time, id): pass next_cursor back as ?cursor= until it is null
+def _page(list_fn, *args, **kwargs) -> dict:
+    try:
+        items, next_cursor = list_fn(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/users", response_model=schemas.UserPage)
+def get_users(
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=crud.PAGE_SIZE_DEFAULT, ge=1, le=crud.PAGE_SIZE_MAX),
+    db: Session = Depends(get_read_db),
+):
+    return _page(crud.list_users, db, cursor=cursor, limit=limit)
 
 @app.get("/users/{usercode}", response_model=schemas.UserOut)
-def get_user(usercode: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.usercode == usercode).first()
+def get_user(usercode: str, db: Session = Depends(get_read_db)):
+    user = user_cache.get_user(db, usercode)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.get("/questions", response_model=List[schemas.QuestionOut])
-def get_questions(db: Session = Depends(get_db)):
+def get_questions(db: Session = Depends(get_read_db)):
     return db.query(models.Question).order_by(models.Question.id.asc()).all()
 
 @app.post("/questions", response_model=schemas.QuestionOut)
@@ -181,7 +289,7 @@ def create_question(question: schemas.QuestionCreate, db: Session = Depends(get_
 
 @app.post("/validate_usercode", response_model=schemas.UserCodeValidOut)
 def validate_usercode(data: schemas.UserCodeValidate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.usercode == data.usercode).first()
+    user = user_cache.get_user(db, data.usercode)
     return {"valid": user is not None}
 
 @app.get("/questions/config")
@@ -201,14 +309,41 @@ def reload_questions_config():
 
 # --- Submit (Finish) Survey: increment + save + retro-tag ---
 
+def _int_answers(answers: dict) -> dict:
+    """{question_id: answer} as ints; 400 on anything else (floats, bools, non-numeric strings)."""
+    parsed = {}
+    for qid, answer in answers.items():
+        try:
+            parsed[int(str(qid))] = int(str(answer))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Question id and answer must be integers: {qid!r}: {answer!r}")
+    return parsed
+
+def _replayed_submit(db: Session, key: str, usercode: str):
+    """Response of an earlier submit with the same idempotency key, or None."""
+    prior = crud.get_submission_key(db, key)
+    if prior is None:
+        return None
+    if prior.usercode != usercode:
+        raise HTTPException(status_code=409, detail="Idempotency key was already used by another user")
+    print(f" Replayed survey submit for user: {usercode} (session {prior.session_no})")
+    return {"status": "success", "message": "Survey already submitted", "session_no": prior.session_no, "replayed": True}
+
 @app.post("/submit_survey")
-def submit_survey(payload: dict, db: Session = Depends(get_db)):
+def submit_survey(
+    payload: dict,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None),
+):
     """
     Finishes a survey run.
-    Expected payload: { "usercode": str, "answers": {question_id: int}, "completed_at": str? }
-    Steps:
+    Expected payload: { "usercode": str, "answers": {question_id: int}, "completed_at": str?, "submission_id": str? }
+    Retries carrying the same Idempotency-Key header (or submission_id) return the original
+    session_no without writing anything again.
+    Steps (one transaction):
       1) increment users.session_count -> new_session_no
-      2) save user_responses with session_no = new_session_no
+      2) save user_responses with session_no = new_session_no (and bump the answer_counts histogram,
+         point user_latest_responses at the new answers)
       3) retro-tag user_chats and user_feedback where session_no=0 AND created_time >= users.session_start_time
     """
     try:
@@ -217,31 +352,33 @@ def submit_survey(payload: dict, db: Session = Depends(get_db)):
 
         if not usercode or not isinstance(answers, dict):
             raise HTTPException(status_code=400, detail="Missing usercode or answers")
-
-        user = db.query(models.User).filter(models.User.usercode == usercode).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
+        # Validated up front so user_responses and answer_counts get the same rows
+        answers = _int_answers(answers)
+
+        key = idempotency_key or payload.get("submission_id")
+        if key is not None:
+            key = str(key)
+            if len(key) > 100:
+                raise HTTPException(status_code=400, detail="Idempotency key too long (max 100 characters)")
+            replay = _replayed_submit(db, key, usercode)
+            if replay is not None:
+                return replay
+
+        # Buffered chats/feedback must be in the table before the retro-tag below
+        write_behind.flush_or_warn()
+
+        # Everything below is one transaction
         # 1) increment session_count
-        new_session_no = increment_session(db, usercode)  # commits user; refresh done inside
-        user = db.query(models.User).filter(models.User.usercode == usercode).first()
+        user = increment_session(db, usercode)
+        new_session_no = user.session_count
+        if key is not None:
+            # A concurrent retry with the same key blocks here, then fails with IntegrityError
+            crud.add_submission_key(db, key=key, usercode=usercode, session_no=new_session_no)
 
-        # 2) save responses with this session_no
-        for qid_str, answer in answers.items():
-            try:
-                qid = int(qid_str)
-            except (ValueError, TypeError):
-                qid = qid_str
-            new_response = models.UserResponse(
-                question_id=qid,
-                answer=int(answer),
-                usercode=usercode,
-                # chat_history="",
-                session_no=new_session_no
-                # created_time auto
-            )
-            db.add(new_response)
-        db.commit()
+        # 2) save responses with this session_no (one multi-row INSERT)
+        crud.create_user_responses(db, usercode=usercode, session_no=new_session_no, answers=answers)
+        crud.increment_answer_counts(db, user=user, session_no=new_session_no, answers=answers)
+        crud.update_latest_responses(db, usercode=usercode, session_no=new_session_no)
 
         # 3) retro-tag chats & feedback from this in-progress window
         # Only if we have a session_start_time to anchor on
@@ -260,13 +397,21 @@ def submit_survey(payload: dict, db: Session = Depends(get_db)):
                 models.UserFeedback.created_time >= user.session_start_time
             ).update({models.UserFeedback.session_no: new_session_no}, synchronize_session=False)
 
-            db.commit()
+        db.commit()
+        read_router.pin(usercode)   # the results page reads these answers right away
 
         print(f" Survey submitted successfully for user: {usercode} (session {new_session_no})")
         return {"status": "success", "message": "Survey submitted successfully", "session_no": new_session_no}
 
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        replay = _replayed_submit(db, key, usercode) if key is not None else None
+        if replay is not None:
+            return replay
+        print(f" Error submitting survey: {e}")
+        raise HTTPException(status_code=500, detail=f"Error submitting survey: {str(e)}")
     except Exception as e:
         db.rollback()
         print(f" Error submitting survey: {e}")
@@ -274,8 +419,16 @@ def submit_survey(payload: dict, db: Session = Depends(get_db)):
 
 # --- Responses (use created_time + include session_no) ---
 
+# Aggregate reads take the caller's ?usercode= only for routing: get_read_db sends a participant
+# who just submitted to the primary, so the chart includes their own answers despite replica lag.
+READ_ROUTING_USERCODE = Query(default=None, description="caller's usercode; reads from the primary right after their own writes")
+
 @app.get("/question_answers/{question_id}")
-def get_question_answers(question_id: int, db: Session = Depends(get_db)):
+def get_question_answers(
+    question_id: int,
+    usercode: Optional[str] = READ_ROUTING_USERCODE,
+    db: Session = Depends(get_read_db),
+):
     """Get all answers for a specific question from user_responses table"""
     try:
         # Fetch all responses for the given question_id
@@ -293,12 +446,49 @@ def get_question_answers(question_id: int, db: Session = Depends(get_db)):
         print(f" Error fetching question answers: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching question answers: {str(e)}")
 
+@app.get("/questions/{question_id}/distribution")
+def get_question_distribution(
+    question_id: int,
+    session: Optional[int] = Query(default=None),
+    demographic: Optional[str] = Query(default=None, description="users column, e.g. gender or country"),
+    value: Optional[str] = Query(default=None),
+    usercode: Optional[str] = READ_ROUTING_USERCODE,
+    db: Session = Depends(get_read_db),
+):
+    """Per-answer counts for a question, optionally for one session and/or one demographic group."""
+    if demographic is not None and demographic not in crud.DEMOGRAPHIC_DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown demographic '{demographic}'; use one of {', '.join(crud.DEMOGRAPHIC_DIMENSIONS)}",
+        )
+    if (demographic is None) != (value is None):
+        raise HTTPException(status_code=400, detail="demographic and value must be given together")
+
+    counts = crud.answer_distribution(
+        db, question_id, session_no=session,
+        dimension=demographic or "all", dim_value=value or "",
+    )
+    # Always report the full 1-6 scale, plus any out-of-range answers that were stored
+    scale = sorted(set(range(1, 7)) | set(counts))
+    return {
+        "question_id": question_id,
+        "session": session,
+        "demographic": demographic,
+        "value": value,
+        "counts": {str(a): counts.get(a, 0) for a in scale},
+        "total": sum(counts.values()),
+    }
+
 @app.get("/user_responses/{usercode}")
-def get_user_responses(usercode: str, db: Session = Depends(get_db)):
+def get_user_responses(
+    usercode: str,
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=crud.PAGE_SIZE_DEFAULT, ge=1, le=crud.PAGE_SIZE_MAX),
+    db: Session = Depends(get_read_db),
+):
     try:
-        responses = db.query(models.UserResponse).filter(
-            models.UserResponse.usercode == usercode
-        ).order_by(models.UserResponse.created_time.desc()).all()
+        responses, next_cursor = crud.list_user_responses(db, usercode, cursor=cursor, limit=limit)
+        total = db.query(func.count(models.UserResponse.id)).filter(models.UserResponse.usercode == usercode).scalar()
 
         response_data = []
         for r in responses:
@@ -310,32 +500,52 @@ def get_user_responses(usercode: str, db: Session = Depends(get_db)):
                 "session_no": r.session_no
                 # "chat_history": r.chat_history
             })
-        return {"usercode": usercode, "total_responses": len(response_data), "responses": response_data}
+        return {"usercode": usercode, "total_responses": total, "responses": response_data, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user responses: {str(e)}")
 
+@app.get("/export/{table}")
+def export_table(
+    table: str,
+    format: str = Query(default="ndjson", description=" | ".join(EXPORT_FORMATS)),
+    since: Optional[datetime] = Query(default=None, description="created_time >= since"),
+    until: Optional[datetime] = Query(default=None, description="created_time < until"),
+    session: Optional[int] = Query(default=None),
+    usercode: Optional[str] = Query(default=None),
+):
+    """
+    Stream a whole table (users | responses | chats | feedback) as NDJSON or CSV.
+    Rows come from a server-side cursor and are sent as they are fetched (constant memory),
+    on a read replica when one is configured (the primary for a participant who just wrote).
+    """
+    write_behind.flush_or_warn()    # include buffered chats/feedback
+    source_name, source = read_router.read_engine(usercode)
+    try:
+        lines = export_lines(
+            source, table, format,
+            since=since, until=until, session_no=session, usercode=usercode,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunked(lines),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"', "X-DB-Engine": source_name},
+    )
+
 @app.get("/user_latest_responses/{usercode}")
-def get_user_latest_responses(usercode: str, db: Session = Depends(get_db)):
+def get_user_latest_responses(usercode: str, db: Session = Depends(get_read_db)):
+    """Latest answer per question, from the user_latest_responses projection that /submit_survey maintains."""
     try:
-        latest_timestamps = db.query(
-            models.UserResponse.question_id,
-            func.max(models.UserResponse.created_time).label('latest_ct')
-        ).filter(
-            models.UserResponse.usercode == usercode
-        ).group_by(models.UserResponse.question_id).subquery()
-
-        latest_responses = db.query(models.UserResponse).join(
-            latest_timestamps,
-            (models.UserResponse.question_id == latest_timestamps.c.question_id) &
-            (models.UserResponse.created_time == latest_timestamps.c.latest_ct)
-        ).filter(
-            models.UserResponse.usercode == usercode
-        ).all()
+        latest_responses = crud.list_latest_responses(db, usercode)
 
         response_data = {}
         for r in latest_responses:
             response_data[r.question_id] = {
-                "id": r.id,
+                "id": r.response_id,
                 "answer": r.answer,
                 "created_time": r.created_time.isoformat() if r.created_time else None,
                 "session_no": r.session_no
@@ -349,8 +559,77 @@ def get_user_latest_responses(usercode: str, db: Session = Depends(get_db)):
 
 @app.get("/llm/health")
 async def llm_health():
-    out = await _llm.healthz()
-    return {"status": "ok", "llm": out, "base_url": LLM_ENDPOINT_DISPLAY}
+    backends = await _llm.healthz_all()
+    healthy = [b for b in backends if b["healthy"]]
+    body = {
+        "status": "ok" if healthy else "unavailable",
+        "llm": healthy[0]["health"] if healthy else None,
+        "base_url": LLM_ENDPOINT_DISPLAY,
+        "backends": backends,
+    }
+    if not healthy:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/llm/state")
+def llm_state():
+    """Adaptive concurrency limit, circuit breaker, retry budget, per-backend routing and scheduler queues."""
+    return _llm.guard_stats()
+
+@app.get("/llm/pool")
+def llm_pool():
+    """Connection pool statistics for the shared LLM client (open / idle / waiting)."""
+    return _llm.pool_stats()
+
+@app.get("/llm/coalescing")
+def llm_coalescing():
+    """Single-flight metrics: upstream calls issued vs. callers that joined an identical in-flight call."""
+    return _llm.coalesce_stats()
+
+@app.get("/llm/feedback_cache")
+def llm_feedback_cache():
+    """Hit/miss counters of the answer-feedback response cache."""
+    return feedback_cache.stats()
+
+@app.delete("/llm/feedback_cache")
+def clear_llm_feedback_cache():
+    feedback_cache.clear()
+    return {"status": "cleared"}
+
+@app.get("/db/pool")
+def db_pool():
+    """Connection pool gauges and checkout/wait/invalidation counters per engine."""
+    return {name: metrics.stats() for name, metrics in POOL_METRICS.items()}
+
+@app.get("/db/replicas")
+def db_replicas():
+    """Read replicas, reads served per engine and primary pins."""
+    return read_router.stats()
+
+@app.get("/db/user_cache")
+def db_user_cache():
+    """Hit rate and size of the in-process user lookup cache."""
+    return user_cache.stats()
+
+@app.get("/db/usercode_pool")
+def db_usercode_pool():
+    """Pre-generated usercodes left for /register and refill statistics."""
+    return usercode_pool.stats()
+
+@app.get("/db/write_behind")
+def db_write_behind():
+    """Pending rows and batch statistics of the chat/feedback write-behind buffer."""
+    return write_behind.stats()
+
+@app.get("/llm/feedback_corpus")
+def llm_feedback_corpus():
+    """Summary of the precomputed answer-feedback corpus."""
+    return feedback_corpus.stats()
+
+@app.post("/llm/feedback_corpus/reload")
+def reload_llm_feedback_corpus():
+    feedback_corpus.load()
+    return {"status": "success", **feedback_corpus.stats()}
 
 class GenerateRequest(BaseModel):
     prompt: str
@@ -376,7 +655,7 @@ async def v1_generate(req: GenerateRequest):
     return {"text": data.get("output", "")}
 
 @app.post("/v1/chat", response_model=dict)
-async def v1_chat(req: schemas.LLMChatRequest, db: Session = Depends(get_db)):
+async def v1_chat(req: schemas.LLMChatRequest, db: AsyncSession = Depends(get_async_db)):
     payload = {
         "messages": [m.dict() for m in req.messages],
         "max_new_tokens": req.max_new_tokens or 256,
@@ -384,7 +663,7 @@ async def v1_chat(req: schemas.LLMChatRequest, db: Session = Depends(get_db)):
         "top_p": req.top_p or 0.9,
     }
     try:
-        data, latency_ms = await _llm.chat(payload)
+        data, latency_ms = await _llm.chat(payload, usercode=req.usercode)
     except httpx.ReadTimeout:
         raise HTTPException(status_code=504, detail="LLM backend timed out while warming up; please retry.")
     except httpx.RequestError as e:
@@ -393,73 +672,200 @@ async def v1_chat(req: schemas.LLMChatRequest, db: Session = Depends(get_db)):
     ai_text = data.get("output", "")
 
     if req.usercode:
-        user_msg = ""
-        for m in reversed(req.messages):
-            if m.role.lower() == "user":
-                user_msg = m.content
-                break
+        user_msg = _last_user_message(req.messages)
+        # Save as in-progress (session 0)
+        fields = dict(
+            usercode=req.usercode,
+            user_message=user_msg,
+            ai_response=ai_text,
+            model_id=data.get("model"),
+            endpoint=f"{data.get('backend_url', LLM_ENDPOINT_DISPLAY)}/v1/chat",
+            tokens_in=int(data.get("prompt_tokens", 0)),
+            tokens_out=int(data.get("generated_tokens", 0)),
+            latency_ms=int(latency_ms),
+            session_no=0,
+        )
+        read_router.pin(req.usercode)
+        try:
+            if write_behind.enabled:
+                await _buffer_row(db, write_behind.add_chat, fields)
+            else:
+                await crud.create_user_chat_async(db, **fields)
+        except Exception as e:
+            await db.rollback()
+            print(f"[WARN] Failed to persist chat: {e}")
+    return {"text": ai_text}
+
+async def _buffer_row(db: AsyncSession, add, fields: dict) -> bool:
+    """Hand a row to write-behind, unless its usercode is unknown (the database would reject it)."""
+    usercode = fields["usercode"]
+    try:
+        known = user_cache.contains(usercode) or await crud.user_exists_async(db, usercode)
+    except Exception as e:
+        # Can't check now; the buffer outlasts a database outage and sets the row aside if it is rejected
+        print(f"[WARN] Could not look up usercode {usercode} before buffering: {e}")
+        known = True
+    if not known:
+        print(f"[WARN] Not persisting LLM output for unknown usercode {usercode}")
+        return False
+    add(**fields)
+    return True
+
+def _last_user_message(messages: List[schemas.LLMChatMessage]) -> str:
+    for m in reversed(messages):
+        if m.role.lower() == "user":
+            return m.content
+    return ""
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+@app.post("/v1/chat/stream")
+async def v1_chat_stream(req: schemas.LLMChatRequest):
+    """
+    Server-Sent-Events variant of /v1/chat.
+    Emits `data: {"token": ...}` per chunk, then `event: done` with the full text and timings.
+    The assembled reply is persisted (session 0) once the stream ends.
+    """
+    payload = {
+        "messages": [m.dict() for m in req.messages],
+        "max_new_tokens": req.max_new_tokens or 256,
+        "temperature": req.temperature or 0.2,
+        "top_p": req.top_p or 0.9,
+    }
+
+    async def event_stream():
+        t0 = time.perf_counter()
+        ttft_ms: Optional[int] = None
+        parts: List[str] = []
+        meta: dict = {}
         try:
-            # Save as in-progress (session 0)
-            crud.create_user_chat(
-                db,
+            async for event in _llm.chat_stream(payload, usercode=req.usercode):
+                if event.get("done"):
+                    meta = event
+                    break
+                token = event.get("token", "")
+                if ttft_ms is None:
+                    ttft_ms = int((time.perf_counter() - t0) * 1000)
+                parts.append(token)
+                yield _sse({"token": token})
+        except LLMUnavailable as e:
+            yield _sse({"detail": e.detail, "retry_after": e.retry_after, **e.hints}, event="error")
+            return
+        except httpx.ReadTimeout:
+            yield _sse({"detail": "LLM backend timed out while warming up; please retry."}, event="error")
+            return
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            yield _sse({"detail": f"LLM backend unavailable; please retry. ({str(e)})"}, event="error")
+            return
+
+        latency_ms = int((time.perf_counter() - t0) * 1000)
+        ai_text = "".join(parts)
+
+        chat_id = None
+        if req.usercode:
+            fields = dict(
                 usercode=req.usercode,
-                user_message=user_msg,
+                user_message=_last_user_message(req.messages),
                 ai_response=ai_text,
-                model_id=data.get("model"),
-                endpoint=f"{LLM_ENDPOINT_DISPLAY}/v1/chat",
-                tokens_in=int(data.get("prompt_tokens", 0)),
-                tokens_out=int(data.get("generated_tokens", 0)),
-                latency_ms=int(latency_ms),
+                model_id=meta.get("model"),
+                endpoint=f"{meta.get('backend_url', LLM_ENDPOINT_DISPLAY)}/v1/chat",
+                tokens_in=int(meta.get("prompt_tokens", 0) or 0),
+                tokens_out=int(meta.get("generated_tokens", 0) or 0),
+                latency_ms=latency_ms,
+                ttft_ms=ttft_ms,
                 session_no=0,
             )
-        except Exception as e:
-            db.rollback()
-            print(f"[WARN] Failed to persist chat: {e}")
-    return {"text": ai_text}
+            read_router.pin(req.usercode)
+            # The request-scoped session may already be closed while streaming; use our own
+            async with AsyncSessionLocal() as db:
+                if write_behind.enabled:
+                    await _buffer_row(db, write_behind.add_chat, fields)
+                else:
+                    try:
+                        rec = await crud.create_user_chat_async(db, **fields)
+                        chat_id = rec.id
+                    except Exception as e:
+                        await db.rollback()
+                        print(f"[WARN] Failed to persist streamed chat: {e}")
+
+        yield _sse({"text": ai_text, "chat_id": chat_id, "ttft_ms": ttft_ms, "latency_ms": latency_ms}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/v1/survey/answer_feedback")
-async def v1_answer_feedback(req: schemas.AnswerFeedbackIn, db: Session = Depends(get_db)):
+async def v1_answer_feedback(req: schemas.AnswerFeedbackIn, db: AsyncSession = Depends(get_async_db)):
     qtext = req.question_text
     if not qtext:
-        q = db.query(models.Question).filter(models.Question.id == req.question_id).first()
+        q = await crud.get_question_async(db, req.question_id)
         qtext = q.text if q else f"Question {req.question_id}"
 
-    payload = {
-        "user_id": req.usercode,
-        "survey_id": req.survey_id,
-        "questions_and_answers": [
-            {"question_id": req.question_id, "question": qtext, "answer": str(req.answer)}
-        ],
-        "max_new_tokens": req.max_new_tokens or 220,
-        "temperature": req.temperature or 0.2,
-    }
-    try:
-        data, _latency = await _llm.answer_feedback(payload)
-    except httpx.ReadTimeout:
-        raise HTTPException(status_code=504, detail="LLM backend timed out while warming up; please retry.")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=503, detail=f"LLM backend unavailable; please retry. ({str(e)})")
+    payload = answer_feedback_payload(
+        req.usercode,
+        req.survey_id,
+        req.question_id,
+        qtext,
+        req.answer,
+        req.max_new_tokens or 220,
+        req.temperature or 0.2,
+    )
+
+    # Precomputed corpus first (see precompute_feedback.py), then the live response cache
+    bypass = req.use_cache is False
+    use_cache = feedback_cache.enabled and not bypass
+    cache_key = feedback_cache.key(
+        req.survey_id, req.question_id, qtext, req.answer, payload["max_new_tokens"], payload["temperature"]
+    )
+    data = None
+    if not bypass:
+        corpus_text = feedback_corpus.pick(req.survey_id, req.question_id, req.answer)
+        if corpus_text is not None:
+            data = {"output": corpus_text}
+    if data is None and use_cache:
+        data = feedback_cache.get(cache_key)
+    cached = data is not None
+
+    if data is None:
+        try:
+            # A cache bypass asks for a fresh sample, so don't share an identical in-flight call either
+            data, _latency = await _llm.answer_feedback(payload, usercode=req.usercode, coalesce=not bypass)
+        except httpx.ReadTimeout:
+            raise HTTPException(status_code=504, detail="LLM backend timed out while warming up; please retry.")
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=503, detail=f"LLM backend unavailable; please retry. ({str(e)})")
+        if use_cache and data.get("output"):
+            feedback_cache.put(cache_key, data)
 
     feedback = data.get("output", "")
 
+    # Cache hits are persisted too, so submit_survey can retro-tag them like any other step feedback
+    fields = dict(
+        usercode=req.usercode,
+        question_id=req.question_id,
+        feedback_text=feedback,
+        feedback_type="step",
+        session_no=0,   # in-progress
+    )
+    read_router.pin(req.usercode)
+    if write_behind.enabled:
+        # No row id until the batch is written
+        await _buffer_row(db, write_behind.add_feedback, fields)
+        return {"text": feedback, "feedback_id": None, "session_no": 0, "cached": cached}
     try:
-        rec = crud.create_user_feedback(
-            db,
-            usercode=req.usercode,
-            question_id=req.question_id,
-            feedback_text=feedback,
-            feedback_type="step",
-            session_no=0,   # in-progress
-        )
-        return {"text": feedback, "feedback_id": rec.id, "session_no": 0}
+        rec = await crud.create_user_feedback_async(db, **fields)
+        return {"text": feedback, "feedback_id": rec.id, "session_no": 0, "cached": cached}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"[WARN] Failed to persist answer feedback: {e}")
-        return {"text": feedback, "feedback_id": None}
+        return {"text": feedback, "feedback_id": None, "cached": cached}
 
-@app.post("/v1/survey/final_feedback")
-async def v1_final_feedback(req: schemas.FinalFeedbackIn, db: Session = Depends(get_db)):
-    payload = {
+def _final_feedback_payload(req: schemas.FinalFeedbackIn) -> dict:
+    return {
         "user_id": req.usercode,
         "survey_id": req.survey_id,
         "all_answers": req.all_answers,
@@ -467,8 +873,12 @@ async def v1_final_feedback(req: schemas.FinalFeedbackIn, db: Session = Depends(
         "max_new_tokens": req.max_new_tokens or 380,
         "temperature": req.temperature or 0.2,
     }
+
+@app.post("/v1/survey/final_feedback")
+async def v1_final_feedback(req: schemas.FinalFeedbackIn, db: AsyncSession = Depends(get_async_db)):
+    payload = _final_feedback_payload(req)
     try:
-        data, _latency = await _llm.final_feedback(payload)
+        data, _latency = await _llm.final_feedback(payload, usercode=req.usercode)
     except httpx.ReadTimeout:
         raise HTTPException(status_code=504, detail="LLM backend timed out while warming up; please retry.")
     except httpx.RequestError as e:
@@ -476,43 +886,83 @@ async def v1_final_feedback(req: schemas.FinalFeedbackIn, db: Session = Depends(
 
     feedback = data.get("output", "")
 
+    fields = dict(
+        usercode=req.usercode,
+        question_id=0,
+        feedback_text=feedback,
+        feedback_type="final",
+        session_no=0,  # in-progress; will be re-tagged on submit_survey
+    )
+    read_router.pin(req.usercode)
+    if write_behind.enabled:
+        await _buffer_row(db, write_behind.add_feedback, fields)
+        return {"text": feedback, "feedback_id": None, "session_no": 0}
     try:
-        rec = crud.create_user_feedback(
-            db,
-            usercode=req.usercode,
-            question_id=0,
-            feedback_text=feedback,
-            feedback_type="final",
-            session_no=0,  # in-progress; will be re-tagged on submit_survey
-        )
+        rec = await crud.create_user_feedback_async(db, **fields)
         return {"text": feedback, "feedback_id": rec.id, "session_no": 0}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"[WARN] Failed to persist final feedback: {e}")
         return {"text": feedback, "feedback_id": None}
 
+# --- Final feedback as a background job (submit, then poll) ---
+
+@app.post("/v1/survey/final_feedback/jobs", status_code=202, response_model=schemas.LLMJobOut)
+def submit_final_feedback_job(req: schemas.FinalFeedbackIn, db: Session = Depends(get_db)):
+    """
+    Queue final-feedback generation and return right away.
+    Poll GET /v1/jobs/{job_id}; the result is also stored as a "final" user_feedback row.
+    """
+    if user_cache.get_user(db, req.usercode) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    read_router.pin(req.usercode)
+    return _final_feedback_jobs.submit(db, req.usercode, _final_feedback_payload(req))
+
+@app.get("/v1/jobs/{job_id}", response_model=schemas.LLMJobOut)
+def get_llm_job(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_llm_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/users/{usercode}/jobs", response_model=List[schemas.LLMJobOut])
+def get_user_jobs(
+    usercode: str,
+    session: Optional[int] = Query(default=None),
+    db: Session = Depends(get_read_db),
+):
+    return crud.list_llm_jobs(db, usercode=usercode, session_no=session)
+
 # --- Retrieval with session defaults/overrides ---
 
-@app.get("/users/{usercode}/chats", response_model=List[schemas.UserChatOut])
+@app.get("/users/{usercode}/chats", response_model=schemas.UserChatPage)
 def get_user_chats(
     usercode: str,
     session: Optional[int] = Query(default=None),
     all_sessions: bool = Query(default=False),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=crud.PAGE_SIZE_DEFAULT, ge=1, le=crud.PAGE_SIZE_MAX),
+    db: Session = Depends(get_read_db),
 ):
+    write_behind.flush_or_warn()    # read-your-writes for buffered rows
     if all_sessions:
-        return crud.list_user_chats(db, usercode=usercode, session_no=None)
-    session_no = session if session is not None else get_current_session_no(db, usercode)
-    return crud.list_user_chats(db, usercode=usercode, session_no=session_no)
+        session_no = None
+    else:
+        session_no = session if session is not None else get_current_session_no(db, usercode)
+    return _page(crud.list_user_chats, db, usercode=usercode, session_no=session_no, cursor=cursor, limit=limit)
 
-@app.get("/users/{usercode}/feedback", response_model=List[schemas.UserFeedbackOut])
+@app.get("/users/{usercode}/feedback", response_model=schemas.UserFeedbackPage)
 def get_user_feedback(
     usercode: str,
     session: Optional[int] = Query(default=None),
     all_sessions: bool = Query(default=False),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=crud.PAGE_SIZE_DEFAULT, ge=1, le=crud.PAGE_SIZE_MAX),
+    db: Session = Depends(get_read_db),
 ):
+    write_behind.flush_or_warn()    # read-your-writes for buffered rows
     if all_sessions:
-        return crud.list_user_feedback(db, usercode=usercode, session_no=None)
-    session_no = session if session is not None else get_current_session_no(db, usercode)
-    return crud.list_user_feedback(db, usercode=usercode, session_no=session_no)
+        session_no = None
+    else:
+        session_no = session if session is not None else get_current_session_no(db, usercode)
+    return _page(crud.list_user_feedback, db, usercode=usercode, session_no=session_no, cursor=cursor, limit=limit)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -19,6 +19,12 @@ class UserResponse(Base):
     created_time = Column(DateTime, default=datetime.utcnow)       # replaces timestamp
     user = relationship("User", back_populates="responses")
 
+    __table_args__ = (
+        Index("ix_user_responses_usercode_created", "usercode", "created_time"),                 # /user_responses
+        Index("ix_user_responses_usercode_question_created", "usercode", "question_id", "created_time"),  # latest per question
+        Index("ix_user_responses_question_answer", "question_id", "answer"),                     # /question_answers (covering)
+    )
+
 class UserChat(Base):
     __tablename__ = "user_chats"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -31,7 +37,13 @@ class UserChat(Base):
     endpoint = Column(String(200), default="http://puhti:8001/v1/generate")
     tokens_in = Column(Integer, default=0)
     tokens_out = Column(Integer, default=0)
-    latency_ms = Column(Integer, default=0)
+    latency_ms = Column(Integer, default=0)                        # total latency
+    ttft_ms = Column(Integer, nullable=True)                       # time to first token (streamed replies only)
+
+    __table_args__ = (
+        # /users/{usercode}/chats?session=N ordered by time, and the submit_survey retro-tag
+        Index("ix_user_chats_usercode_session_created", "usercode", "session_no", "created_time"),
+    )
 
 class UserFeedback(Base):
     __tablename__ = "user_feedback"
@@ -44,6 +56,11 @@ class UserFeedback(Base):
     created_time = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="feedback")
 
+    __table_args__ = (
+        # /users/{usercode}/feedback?session=N ordered by time, and the submit_survey retro-tag
+        Index("ix_user_feedback_usercode_session_created", "usercode", "session_no", "created_time"),
+    )
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -60,3 +77,51 @@ class User(Base):
 
     responses = relationship("UserResponse", back_populates="user")
     feedback = relationship("UserFeedback", back_populates="user")
+
+    __table_args__ = (
+        Index("ix_users_created_id", "created_time", "id"),                                       # /users keyset pages
+    )
+
+class LLMJob(Base):
+    __tablename__ = "llm_jobs"
+    id = Column(String(36), primary_key=True)                      # uuid4, returned to the client
+    kind = Column(String(50), default="final_feedback", index=True)
+    usercode = Column(String(50), ForeignKey("users.usercode"), index=True)
+    session_no = Column(Integer, index=True, default=0)            # session the job belongs to (session_count + 1 at submit)
+    status = Column(String(20), default="queued", index=True)      # "queued" | "running" | "done" | "failed"
+    payload = Column(Text)                                         # JSON body sent to the LLM
+    result_text = Column(Text, nullable=True)
+    feedback_id = Column(Integer, nullable=True)                   # user_feedback row written on success
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String(100), nullable=True)
+    lease_expires = Column(DateTime, nullable=True)                # running: worker lease; queued: retry not before
+    created_time = Column(DateTime, default=datetime.utcnow)
+    finished_time = Column(DateTime, nullable=True)
+
+class SubmissionKey(Base):
+    __tablename__ = "submission_keys"
+    key = Column(String(100), primary_key=True)                    # Idempotency-Key header or payload submission_id
+    usercode = Column(String(50), ForeignKey("users.usercode"))
+    session_no = Column(Integer)                                   # session the first submit created; replays return it
+    created_time = Column(DateTime, default=datetime.utcnow, index=True)   # TTL cleanup
+
+class UserLatestResponse(Base):
+    """Each participant's latest answer per question, upserted by submit_survey (GET /user_latest_responses)."""
+    __tablename__ = "user_latest_responses"
+    usercode = Column(String(50), ForeignKey("users.usercode"), primary_key=True)
+    question_id = Column(Integer, primary_key=True)
+    response_id = Column(Integer, nullable=False)                  # user_responses.id of that answer
+    answer = Column(Integer)
+    session_no = Column(Integer)
+    created_time = Column(DateTime)
+
+class AnswerCount(Base):
+    """Per-answer counters for /questions/{id}/distribution, bumped by submit_survey."""
+    __tablename__ = "answer_counts"
+    question_id = Column(Integer, primary_key=True)
+    dimension = Column(String(20), primary_key=True)               # "all" or a users column (gender, country, ...)
+    dim_value = Column(String(100), primary_key=True)              # "" for "all" and for unanswered demographics
+    session_no = Column(Integer, primary_key=True)
+    answer = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,144 @@
+"""
+Connection pool metrics for GET /db/pool.
+Counters come from SQLAlchemy pool events (checkout, checkin, connect, invalidate);
+checkout wait time comes from the pool classes below, which time Pool.connect(),
+the call that blocks while every connection is in use. Metrics are registered per
+pool logging name (pool_logging_name on the engine), so they survive engine.dispose().
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class PoolMetrics:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0              # new DBAPI connections opened
+        self.invalidations = 0         # connections dropped after a disconnect error (or pre-ping failure)
+        self.soft_invalidations = 0    # marked for replacement on next checkin (e.g. recycle)
+        self.timeouts = 0              # checkouts that gave up after pool_timeout
+        self.waits = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.slow_waits = 0            # checkouts that waited longer than 10 ms for a free connection
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+
+    def attach(self, engine) -> None:
+        """Listen to the engine's pool events (the listeners carry over when the pool is recreated)."""
+        self.engine = engine
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_soft_invalidate)
+
+    # -------- event handlers --------
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        pool = self.engine.pool
+        with self._lock:
+            self.checkouts += 1
+            if hasattr(pool, "checkedout"):
+                self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+                self.peak_overflow = max(self.peak_overflow, pool.overflow())
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.checkins += 1
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.soft_invalidations += 1
+
+    def observe_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            if seconds > 0.010:
+                self.slow_waits += 1
+            if timed_out:
+                self.timeouts += 1
+
+    # -------- report --------
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool if self.engine is not None else None
+        gauges: Dict[str, Any] = {"pool_class": type(pool).__name__ if pool is not None else None}
+        if pool is not None and hasattr(pool, "checkedout"):
+            gauges.update({
+                "size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout_s": pool.timeout(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            })
+        with self._lock:
+            return {
+                **gauges,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_total_s / self.waits * 1000, 3) if self.waits else 0.0,
+                "wait_ms_max": round(self.wait_max_s * 1000, 3),
+                "slow_waits": self.slow_waits,
+                "peak_checked_out": self.peak_checked_out,
+                "peak_overflow": max(0, self.peak_overflow),
+            }
+
+# pool logging name -> metrics
+POOL_METRICS: Dict[str, PoolMetrics] = {}
+
+def track_engine(engine, name: str) -> PoolMetrics:
+    """Register metrics for an engine created with pool_logging_name=name."""
+    metrics = POOL_METRICS[name] = PoolMetrics(name)
+    metrics.attach(engine)
+    return metrics
+
+def _metrics_for(pool) -> Optional[PoolMetrics]:
+    return POOL_METRICS.get(pool.logging_name)
+
+class _TimedCheckout:
+    """Times Pool.connect(): the wait for a free connection, plus opening one when the pool grows and the pre-ping."""
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            metrics = _metrics_for(self)
+            if metrics is not None:
+                metrics.observe_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        metrics = _metrics_for(self)
+        if metrics is not None:
+            metrics.observe_wait(time.perf_counter() - t0)
+        return connection
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
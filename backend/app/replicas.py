@@ -0,0 +1,154 @@
+"""
+Read-replica routing for the GET endpoints.
+get_read_db hands out a session on one of the DATABASE_REPLICA_URLS (round robin),
+or on the primary when there are no replicas, when the request asks for it
+(X-Read-Primary: true), or when the participant in the path wrote something in
+the last DB_REPLICA_PIN_S seconds, so they read their own writes despite
+replication lag. Pins are per worker process. A replica that fails to connect is
+skipped for DB_REPLICA_RETRY_S seconds. The engine used is returned in the
+X-DB-Engine response header and counted in GET /db/replicas.
+"""
+
+import os
+import threading
+import time
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import SessionLocal, create_db_engine, engine
+
+class ReadRouter:
+    def __init__(self) -> None:
+        self.urls = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+        self.pin_s = float(os.getenv("DB_REPLICA_PIN_S", "5"))            # keep at least the replication lag
+        self.retry_s = float(os.getenv("DB_REPLICA_RETRY_S", "30"))       # skip a failed replica this long
+        self.log_routing = os.getenv("DB_LOG_ROUTING", "false").lower() in ("1", "true", "yes")
+
+        self.replicas: List[Tuple[str, Any, sessionmaker]] = []
+        for i, url in enumerate(self.urls, 1):
+            name = f"replica_{i}"
+            replica_engine = create_db_engine(url, name=name)
+            self.replicas.append((name, replica_engine, sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)))
+
+        self._next = count()
+        self._lock = threading.Lock()
+        self._pinned: Dict[str, float] = {}         # usercode -> monotonic time the pin ends
+        self._down_until: Dict[str, float] = {}     # replica name -> monotonic time to try it again
+
+        self.reads: Dict[str, int] = {"primary": 0, **{name: 0 for name, _, _ in self.replicas}}
+        self.pinned_reads = 0
+        self.forced_reads = 0
+        self.failovers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    # -------- pinning --------
+
+    def pin(self, usercode: Optional[str]) -> None:
+        """Send this participant's reads to the primary for the next pin_s seconds (call after a write)."""
+        if not usercode or not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pinned[usercode] = now + self.pin_s
+            if len(self._pinned) > 10000:
+                self._pinned = {code: until for code, until in self._pinned.items() if until > now}
+
+    def is_pinned(self, usercode: Optional[str]) -> bool:
+        if not usercode:
+            return False
+        with self._lock:
+            until = self._pinned.get(usercode)
+        return until is not None and until > time.monotonic()
+
+    # -------- routing --------
+
+    def _healthy_replicas(self) -> List[Tuple[str, Any, sessionmaker]]:
+        now = time.monotonic()
+        return [r for r in self.replicas if self._down_until.get(r[0], 0.0) <= now]
+
+    def session(self, usercode: Optional[str] = None, primary: bool = False) -> Tuple[str, Session]:
+        """(engine name, open session) for a read; the replica's connection is checked out up front."""
+        if primary or not self.enabled or self.is_pinned(usercode):
+            with self._lock:
+                if primary and self.enabled:
+                    self.forced_reads += 1
+                elif self.enabled:
+                    self.pinned_reads += 1
+                self.reads["primary"] += 1
+            return "primary", SessionLocal()
+
+        candidates = self._healthy_replicas()
+        start = next(self._next)
+        for i in range(len(candidates)):
+            name, _, make_session = candidates[(start + i) % len(candidates)]
+            db = make_session()
+            try:
+                db.connection()     # fail over now rather than on the endpoint's first query
+            except DBAPIError as e:
+                db.close()
+                with self._lock:
+                    self._down_until[name] = time.monotonic() + self.retry_s
+                    self.failovers += 1
+                print(f"[WARN] Read replica {name} unavailable, skipping it for {self.retry_s:.0f}s: {e}")
+                continue
+            with self._lock:
+                self.reads[name] += 1
+            return name, db
+
+        with self._lock:
+            self.reads["primary"] += 1
+        return "primary", SessionLocal()
+
+    def read_engine(self, usercode: Optional[str] = None) -> Tuple[str, Any]:
+        """(name, engine) for bulk reads that run outside a session (exports)."""
+        candidates = [] if self.is_pinned(usercode) else self._healthy_replicas()
+        name, read_engine = "primary", engine
+        if candidates:
+            name, read_engine, _ = candidates[next(self._next) % len(candidates)]
+        with self._lock:
+            self.reads[name] += 1
+        return name, read_engine
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "replicas": [
+                    {
+                        "name": name,
+                        "url": replica_engine.url.render_as_string(hide_password=True),
+                        "down_for_s": round(max(0.0, self._down_until.get(name, 0.0) - now), 1),
+                    }
+                    for name, replica_engine, _ in self.replicas
+                ],
+                "pin_s": self.pin_s,
+                "pinned_users": sum(1 for until in self._pinned.values() if until > now),
+                "reads": dict(self.reads),
+                "pinned_reads": self.pinned_reads,
+                "forced_reads": self.forced_reads,
+                "failovers": self.failovers,
+            }
+
+# Global instance
+read_router = ReadRouter()
+
+def get_read_db(request: Request, response: Response):
+    """Session for read-only endpoints: a replica if configured, the primary for pinned participants."""
+    usercode = request.path_params.get("usercode") or request.query_params.get("usercode")
+    primary = request.headers.get("x-read-primary", "").lower() in ("1", "true", "yes")
+    name, db = read_router.session(usercode, primary=primary)
+    response.headers["X-DB-Engine"] = name
+    if read_router.log_routing:
+        print(f" {request.method} {request.url.path} -> {name}")
+    try:
+        yield db
+    finally:
+        db.close()
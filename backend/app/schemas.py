@@ -92,6 +92,7 @@ class AnswerFeedbackIn(BaseModel):
     answer: int
     max_new_tokens: Optional[int] = 220
     temperature: Optional[float] = 0.2
+    use_cache: Optional[bool] = True     # set False to force a fresh (sampled) generation
 
 class FinalFeedbackIn(BaseModel):
     usercode: str
@@ -114,6 +115,7 @@ class UserChatOut(BaseModel):
     tokens_in: Optional[int]
     tokens_out: Optional[int]
     latency_ms: Optional[int]
+    ttft_ms: Optional[int] = None
     class Config:
         orm_mode = True
 
@@ -127,3 +129,31 @@ class UserFeedbackOut(BaseModel):
     session_no: int
     class Config:
         orm_mode = True
+
+class LLMJobOut(BaseModel):
+    id: str
+    kind: str
+    usercode: str
+    session_no: int
+    status: str
+    result_text: Optional[str] = None
+    feedback_id: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int
+    created_time: datetime
+    finished_time: Optional[datetime] = None
+    class Config:
+        orm_mode = True
+
+# --- Keyset-paginated listings (pass next_cursor back as ?cursor= for the next page) ---
+class UserPage(BaseModel):
+    items: List[UserOut]
+    next_cursor: Optional[str] = None
+
+class UserChatPage(BaseModel):
+    items: List[UserChatOut]
+    next_cursor: Optional[str] = None
+
+class UserFeedbackPage(BaseModel):
+    items: List[UserFeedbackOut]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,238 @@
+"""
+Columnar snapshot of the survey answers for analytics.
+One row per participant session: usercode, session_no, completed_time, one answer
+column per question (q_<id>) and the demographics from users. Each run appends a
+part with the sessions whose responses arrived after the last watermark, so the
+snapshot grows incrementally instead of re-reading every response.
+
+Formats (pick what is installed):
+  arrow   - Arrow IPC / Feather v2 files, memory-mapped on load (needs pyarrow)
+  parquet - Parquet files, compressed (needs pyarrow)
+  npy     - a directory of .npy arrays per part, loadable with mmap_mode="r" (needs numpy)
+Missing answers are null in arrow/parquet and -1 in npy.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from . import models
+from .crud import DEMOGRAPHIC_DIMENSIONS as DEMOGRAPHICS
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+MANIFEST = "snapshot.json"
+NPY_MISSING = -1
+# Responses newer than now - lag are left for the next run, so transactions still
+# committing at snapshot time can't slip in behind the watermark.
+SNAPSHOT_LAG_S = float(os.getenv("SNAPSHOT_LAG_S", "60"))
+
+def available_formats() -> List[str]:
+    formats = []
+    if pa is not None:
+        formats += ["arrow", "parquet"]
+    if np is not None:
+        formats.append("npy")
+    return formats
+
+def default_format() -> str:
+    formats = available_formats()
+    if not formats:
+        raise RuntimeError("Snapshots need pyarrow (pip install pyarrow) or numpy (pip install numpy)")
+    return formats[0]
+
+# -------- manifest --------
+
+def read_manifest(out_dir: Path) -> Optional[Dict[str, Any]]:
+    path = out_dir / MANIFEST
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_manifest(out_dir: Path, manifest: Dict[str, Any]) -> None:
+    tmp = out_dir / (MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, out_dir / MANIFEST)    # the manifest only ever points at complete parts
+
+# -------- collect --------
+
+def collect_sessions(engine, since: Optional[datetime], until: datetime) -> Dict[str, Any]:
+    """Pivot responses with since < created_time <= until into one row per (usercode, session_no)."""
+    UR, U = models.UserResponse.__table__, models.User.__table__
+    stmt = (
+        select(UR.c.usercode, UR.c.session_no, UR.c.question_id, UR.c.answer, UR.c.created_time,
+               *[U.c[d] for d in DEMOGRAPHICS])
+        .select_from(UR.join(U, U.c.usercode == UR.c.usercode))
+        .where(UR.c.created_time <= until)
+        .order_by(UR.c.usercode, UR.c.session_no, UR.c.id)
+    )
+    if since is not None:
+        stmt = stmt.where(UR.c.created_time > since)
+
+    rows: List[Dict[str, Any]] = []
+    question_ids = set()
+    watermark = since
+    current = None
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=5000).execute(stmt)
+        for r in result:
+            key = (r.usercode, r.session_no)
+            if current is None or current["_key"] != key:
+                current = {
+                    "_key": key,
+                    "usercode": r.usercode,
+                    "session_no": r.session_no or 0,
+                    "completed_time": r.created_time,
+                    "answers": {},
+                    **{d: r[5 + i] for i, d in enumerate(DEMOGRAPHICS)},
+                }
+                rows.append(current)
+            current["answers"][r.question_id] = r.answer     # a repeated answer in one session: last wins
+            question_ids.add(r.question_id)
+            if r.created_time and (current["completed_time"] is None or r.created_time > current["completed_time"]):
+                current["completed_time"] = r.created_time
+            if r.created_time and (watermark is None or r.created_time > watermark):
+                watermark = r.created_time
+    return {"rows": rows, "question_ids": sorted(question_ids), "watermark": watermark}
+
+# -------- write --------
+
+def _write_arrow(path: Path, rows, question_ids, fmt: str) -> None:
+    columns = {
+        "usercode": pa.array([r["usercode"] for r in rows], pa.string()),
+        "session_no": pa.array([r["session_no"] for r in rows], pa.int32()),
+        "completed_time": pa.array([r["completed_time"] for r in rows], pa.timestamp("us")),
+    }
+    for qid in question_ids:
+        columns[f"q_{qid}"] = pa.array([r["answers"].get(qid) for r in rows], pa.int8())
+    for d in DEMOGRAPHICS:
+        columns[d] = pa.array([r[d] for r in rows], pa.string()).dictionary_encode()
+    table = pa.table(columns)
+    if fmt == "parquet":
+        pq.write_table(table, path)
+    else:
+        # Uncompressed IPC file so readers can memory-map it without a decode step
+        with pa_ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table)
+
+def _write_npy(path: Path, rows, question_ids) -> None:
+    path.mkdir()
+    answers = np.full((len(rows), len(question_ids)), NPY_MISSING, dtype=np.int8)
+    col = {qid: j for j, qid in enumerate(question_ids)}
+    for i, r in enumerate(rows):
+        for qid, answer in r["answers"].items():
+            if answer is not None:
+                answers[i, col[qid]] = answer
+    np.save(path / "answers.npy", answers)
+    np.save(path / "question_ids.npy", np.array(question_ids, dtype=np.int32))
+    np.save(path / "session_no.npy", np.array([r["session_no"] for r in rows], dtype=np.int32))
+    np.save(path / "completed_time.npy", np.array([r["completed_time"] for r in rows], dtype="datetime64[us]"))
+    np.save(path / "usercode.npy", np.array([r["usercode"] for r in rows], dtype=str))
+    for d in DEMOGRAPHICS:
+        np.save(path / f"{d}.npy", np.array([r[d] or "" for r in rows], dtype=str))
+
+def run_snapshot(engine, out_dir, fmt: Optional[str] = None, full: bool = False) -> Dict[str, Any]:
+    """Append the sessions after the manifest watermark as a new part. Returns the part's manifest entry (or {} if nothing new)."""
+    out_dir = Path(out_dir)
+    manifest = None if full else read_manifest(out_dir)
+    if manifest is not None:
+        if fmt is not None and fmt != manifest["format"]:
+            raise ValueError(f"Snapshot in {out_dir} is '{manifest['format']}'; use --full to rebuild as '{fmt}'")
+        fmt = manifest["format"]
+    fmt = fmt or default_format()
+    if fmt not in available_formats():
+        raise RuntimeError(f"Format '{fmt}' is not available here (installed: {', '.join(available_formats()) or 'none'})")
+
+    if manifest is None:
+        if full and out_dir.exists():
+            shutil.rmtree(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {"format": fmt, "watermark": None, "question_ids": [], "rows": 0, "parts": []}
+
+    since = datetime.fromisoformat(manifest["watermark"]) if manifest["watermark"] else None
+    until = datetime.utcnow() - timedelta(seconds=SNAPSHOT_LAG_S)
+    data = collect_sessions(engine, since, until)
+    if not data["rows"]:
+        return {}
+
+    n = len(manifest["parts"]) + 1
+    name = f"part-{n:05d}" + {"arrow": ".arrow", "parquet": ".parquet", "npy": ""}[fmt]
+    if fmt == "npy":
+        _write_npy(out_dir / name, data["rows"], data["question_ids"])
+    else:
+        _write_arrow(out_dir / name, data["rows"], data["question_ids"], fmt)
+
+    part = {
+        "file": name,
+        "rows": len(data["rows"]),
+        "since": manifest["watermark"],
+        "watermark": data["watermark"].isoformat(),
+        "created": datetime.utcnow().isoformat(),
+    }
+    manifest["parts"].append(part)
+    manifest["watermark"] = part["watermark"]
+    manifest["rows"] += part["rows"]
+    manifest["question_ids"] = sorted(set(manifest["question_ids"]) | set(data["question_ids"]))
+    _write_manifest(out_dir, manifest)
+    return part
+
+# -------- load --------
+
+def load_snapshot(out_dir):
+    """
+    All parts as one table: a pyarrow.Table for arrow/parquet (arrow parts are memory-mapped),
+    or a dict of numpy arrays for npy (answers is rows x question_ids, -1 = missing).
+    """
+    out_dir = Path(out_dir)
+    manifest = read_manifest(out_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST} in {out_dir}")
+    fmt = manifest["format"]
+    files = [out_dir / p["file"] for p in manifest["parts"]]
+
+    if fmt in ("arrow", "parquet"):
+        if pa is None:
+            raise RuntimeError("pip install pyarrow to load this snapshot")
+        if fmt == "arrow":
+            tables = [pa_ipc.open_file(pa.memory_map(str(f), "r")).read_all() for f in files]
+        else:
+            tables = [pq.read_table(f, memory_map=True) for f in files]
+        if not tables:
+            return pa.table({})
+        # Parts written before a question was added lack its column: promote to null
+        return pa.concat_tables(tables, promote_options="default")
+
+    if np is None:
+        raise RuntimeError("pip install numpy to load this snapshot")
+    question_ids = manifest["question_ids"]
+    col = {qid: j for j, qid in enumerate(question_ids)}
+    parts = [{p.stem: np.load(p, mmap_mode="r") for p in f.glob("*.npy")} for f in files]
+    if len(parts) == 1 and list(parts[0]["question_ids"]) == question_ids:
+        return {**parts[0], "question_ids": np.array(question_ids, dtype=np.int32)}
+    merged: Dict[str, Any] = {"question_ids": np.array(question_ids, dtype=np.int32)}
+    blocks = []
+    for part in parts:
+        block = np.full((part["answers"].shape[0], len(question_ids)), NPY_MISSING, dtype=np.int8)
+        block[:, [col[q] for q in part["question_ids"]]] = part["answers"]
+        blocks.append(block)
+    merged["answers"] = np.concatenate(blocks) if blocks else np.empty((0, len(question_ids)), dtype=np.int8)
+    for key in ("session_no", "completed_time", "usercode") + DEMOGRAPHICS:
+        merged[key] = np.concatenate([part[key] for part in parts]) if parts else np.array([])
+    return merged
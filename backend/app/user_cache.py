@@ -0,0 +1,136 @@
+"""
+In-process TTL/LRU cache of users rows keyed by usercode.
+Most endpoints only need to know whether a participant exists and what their
+session_count is; this serves those lookups without a SELECT per request.
+Entries are read-only snapshots (not ORM objects), so they can be shared across
+threadpool workers. Writes to a user call invalidate_on_commit(db, usercode)
+and the entry is dropped once that transaction commits (or rolls back).
+With several worker processes each has its own cache, so a change made by another
+process shows up after at most USER_CACHE_TTL_S seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+
+_PENDING_KEY = "user_cache_invalidate"    # Session.info key: usercodes to drop when the transaction ends
+
+class UserCache:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("USER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.max_entries = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl_s = float(os.getenv("USER_CACHE_TTL_S", "30"))      # 0 = never expire
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that overlapped one is not stored,
+        # so a row read before a commit can't be cached after the commit dropped it.
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # -------- lookups --------
+
+    def get_user(self, db: Session, usercode: str) -> Optional[SimpleNamespace]:
+        """
+        The user as a read-only snapshot (same attributes as models.User), or None if there is none.
+        Use a real query for anything that modifies the row.
+        """
+        if not self.enabled:
+            user = db.query(models.User).filter(models.User.usercode == usercode).first()
+            return _snapshot(_columns(user)) if user is not None else None
+
+        with self._lock:
+            entry = self._entries.get(usercode)
+            if entry is not None and self.ttl_s and time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[usercode]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(usercode)
+                self.hits += 1
+                return _snapshot(entry[1])
+            self.misses += 1
+            generation = self._generation
+
+        user = db.query(models.User).filter(models.User.usercode == usercode).first()
+        if user is None:
+            return None     # not cached: the code may be registered by another process
+        values = _columns(user)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[usercode] = (time.monotonic(), values)
+                self._entries.move_to_end(usercode)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return _snapshot(values)
+
+    def contains(self, usercode: str) -> bool:
+        """Whether usercode has a live entry (no query; False only means 'not cached')."""
+        with self._lock:
+            entry = self._entries.get(usercode)
+            return entry is not None and not (self.ttl_s and time.monotonic() - entry[0] > self.ttl_s)
+
+    def session_count(self, db: Session, usercode: str) -> int:
+        """Latest completed session number, 0 if the user is unknown or has none."""
+        user = self.get_user(db, usercode)
+        return user.session_count if user and user.session_count is not None else 0
+
+    # -------- invalidation --------
+
+    def invalidate(self, usercode: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(usercode, None)
+
+    def invalidate_on_commit(self, db: Session, usercode: str) -> None:
+        """Drop usercode now and again when db's transaction ends (readers may cache the old row until then)."""
+        self.invalidate(usercode)
+        db.info.setdefault(_PENDING_KEY, set()).add(usercode)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+def _columns(user: models.User) -> Dict[str, Any]:
+    return {c.key: getattr(user, c.key) for c in models.User.__table__.columns}
+
+def _snapshot(values: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(**values)    # a fresh copy per caller
+
+# Global instance
+user_cache = UserCache()
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_pending(session: Session) -> None:
+    for usercode in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate(usercode)
@@ -0,0 +1,137 @@
+"""
+Usercode generation for /register.
+Codes are not checked before use: the unique index on users.usercode decides, and
+register_user retries with a new code on a duplicate-key error. With
+USERCODE_POOL_SIZE > 0 a background task keeps a pool of codes that were already
+generated and checked against users in one batched SELECT, so a registration
+burst only pops a code and inserts. A pooled code can still collide with one
+taken by another worker meanwhile; the insert-and-retry covers that.
+"""
+
+import asyncio
+import os
+import random
+import string
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import select
+
+from . import models
+from .database import SessionLocal
+
+USERCODE_LENGTH = 8
+USERCODE_ALPHABET = string.ascii_uppercase + string.digits
+_rng = random.SystemRandom()    # independent per worker process, even after fork
+
+def generate_usercode(length: int = USERCODE_LENGTH) -> str:
+    return ''.join(_rng.choice(USERCODE_ALPHABET) for _ in range(length))
+
+class UsercodePool:
+    def __init__(self) -> None:
+        self.size = int(os.getenv("USERCODE_POOL_SIZE", "0"))          # 0 = no pool, generate on request
+        self.refill_at = int(os.getenv("USERCODE_POOL_REFILL_AT") or self.size // 2)    # refill when this many are left
+
+        self._codes: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.taken = 0
+        self.empty = 0          # takes that found the pool empty and generated inline
+        self.refills = 0
+        self.discarded = 0      # generated codes that already existed in users
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def take(self) -> str:
+        """A code to try for a new user: from the pool if there is one, else freshly generated."""
+        with self._lock:
+            code = self._codes.popleft() if self._codes else None
+            low = len(self._codes) <= self.refill_at
+        if code is None:
+            if self.enabled:
+                self.empty += 1
+            code = generate_usercode()
+        else:
+            self.taken += 1
+        if low:
+            self._kick()
+        return code
+
+    def _kick(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # -------- refilling --------
+
+    def refill(self) -> int:
+        """Top the pool up to size (blocking). Returns the number of codes added."""
+        with self._lock:
+            missing = self.size - len(self._codes)
+            held = set(self._codes)
+        if missing <= 0:
+            return 0
+        candidates = {generate_usercode() for _ in range(missing)} - held
+        db = SessionLocal()
+        try:
+            # One query for the whole batch instead of one per candidate
+            existing = set(db.scalars(select(models.User.usercode).where(models.User.usercode.in_(candidates))))
+        finally:
+            db.close()
+        fresh: List[str] = sorted(candidates - existing)
+        with self._lock:
+            self._codes.extend(fresh[:max(0, self.size - len(self._codes))])
+        self.discarded += len(existing)
+        self.refills += 1
+        return len(fresh)
+
+    async def _refill_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refill)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+                print(f"[WARN] Usercode pool refill failed: {e}")
+                await asyncio.sleep(5)
+                continue
+            await self._wake.wait()
+            self._wake.clear()
+
+    # -------- lifecycle --------
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._refill_loop())
+        print(f" Usercode pool enabled ({self.size} codes, refilled at {self.refill_at} left)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": len(self._codes),
+            "size": self.size,
+            "refill_at": self.refill_at,
+            "taken": self.taken,
+            "empty": self.empty,
+            "refills": self.refills,
+            "discarded": self.discarded,
+            "last_error": self.last_error,
+        }
+
+# Global instance
+usercode_pool = UsercodePool()
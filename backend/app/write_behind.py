@@ -0,0 +1,236 @@
+"""
+Write-behind buffer for user_chats and user_feedback.
+LLM endpoints hand their rows over and return right away; rows are written in
+multi-row INSERTs every WRITE_BEHIND_MAX_ROWS rows or WRITE_BEHIND_MAX_DELAY_MS ms.
+Readers of those tables (and submit_survey's retro-tag) call flush() first, so
+anything a participant has seen is in the database before it is read back.
+A row the database rejects (e.g. an unknown usercode) would fail its whole batch;
+such batches are retried row by row and the rejected rows are set aside as dead
+letters (GET /db/write_behind), so they can't hold up the rows behind them.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import crud, models
+from .database import engine
+
+# Rows are kept per table in arrival order; created_time is stamped on enqueue,
+# so the retro-tag window in submit_survey sees the time the reply was produced.
+TABLES = {
+    "user_chats": (models.UserChat, crud._user_chat),
+    "user_feedback": (models.UserFeedback, crud._user_feedback),
+}
+
+class WriteBehindBuffer:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.max_rows = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "50"))
+        self.max_delay_s = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "200")) / 1000
+        # Rows that could not be written at shutdown go here and are re-queued on the next start
+        self.spill_file = os.getenv("WRITE_BEHIND_SPILL_FILE", "write_behind_spill.jsonl")
+        self.dead_letter_max = int(os.getenv("WRITE_BEHIND_DEAD_LETTER_MAX", "100"))    # rejected rows kept for inspection
+
+        self._pending: Dict[str, List[Dict[str, Any]]] = {name: [] for name in TABLES}
+        self._lock = threading.Lock()          # guards _pending
+        self._flush_lock = threading.Lock()    # one flush at a time, so rows land in order
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0     # rows the database rejected; dropped from the queue
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=self.dead_letter_max)
+        self.last_error: Optional[str] = None
+
+    # -------- producers --------
+
+    def add_chat(self, **fields) -> None:
+        self._add("user_chats", fields)
+
+    def add_feedback(self, **fields) -> None:
+        self._add("user_feedback", fields)
+
+    def _add(self, table: str, fields: Dict[str, Any]) -> None:
+        model, build = TABLES[table]
+        rec = build(**fields)
+        row = {c.key: getattr(rec, c.key) for c in model.__table__.columns if not c.primary_key}
+        with self._lock:
+            self._pending[table].append(row)
+            full = self.pending() >= self.max_rows
+        if full:
+            self._kick()
+
+    def _kick(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def pending(self) -> int:
+        return sum(len(rows) for rows in self._pending.values())
+
+    # -------- flushing --------
+
+    def flush(self) -> int:
+        """Write everything buffered so far (blocking). Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = {table: rows for table, rows in self._pending.items() if rows}
+                self._pending = {name: [] for name in TABLES}
+            if not batch:
+                return 0
+            try:
+                with engine.begin() as conn:
+                    for table, rows in batch.items():
+                        conn.execute(insert(TABLES[table][0].__table__).values(rows))
+                written = sum(len(rows) for rows in batch.values())
+                self.last_error = None
+            except (IntegrityError, DataError) as e:
+                # Some row is bad; write them one at a time so the good ones still land
+                self.last_error = str(e) or type(e).__name__
+                written = self._write_rows_singly([(table, row) for table, rows in batch.items() for row in rows])
+            except Exception as e:
+                self._requeue(batch)
+                self.failed_flushes += 1
+                self.last_error = str(e) or type(e).__name__
+                raise
+            self.rows_written += written
+            self.flushes += 1
+            return written
+
+    def flush_or_warn(self) -> int:
+        """flush() for request paths: a failure is logged and the rows stay queued, the request goes on."""
+        try:
+            return self.flush()
+        except Exception as e:
+            print(f"[WARN] Write-behind flush failed ({self.pending()} rows kept): {e}")
+            return 0
+
+    def _write_rows_singly(self, rows: List[Tuple[str, Dict[str, Any]]]) -> int:
+        written = 0
+        for i, (table, row) in enumerate(rows):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(TABLES[table][0].__table__).values(row))
+            except (IntegrityError, DataError) as e:
+                self._dead_letter(table, row, e)
+                continue
+            except Exception:
+                # Not the row's fault (connection lost): keep the rest for the next flush
+                rest: Dict[str, List[Dict[str, Any]]] = {}
+                for t, r in rows[i:]:
+                    rest.setdefault(t, []).append(r)
+                self._requeue(rest)
+                self.failed_flushes += 1
+                self.rows_written += written
+                raise
+            written += 1
+        return written
+
+    def _requeue(self, batch: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Put the rows back in front of anything queued meanwhile and try again later
+        with self._lock:
+            for table, rows in batch.items():
+                self._pending[table][:0] = rows
+
+    def _dead_letter(self, table: str, row: Dict[str, Any], error: Exception) -> None:
+        self.dead_lettered += 1
+        self.dead_letters.append({"table": table, "row": row, "error": str(getattr(error, "orig", error))})
+        print(f"[WARN] Write-behind dropped a {table} row for {row.get('usercode')}: {getattr(error, 'orig', error)}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.max_delay_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self.pending():
+                continue
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"[WARN] Write-behind flush failed ({self.pending()} rows kept): {e}")
+
+    # -------- lifecycle --------
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self._load_spill()
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+        print(f" Write-behind enabled (max {self.max_rows} rows / {int(self.max_delay_s * 1000)} ms per batch)")
+
+    async def stop(self) -> None:
+        """Final flush on shutdown; rows that still can't be written are spilled to disk."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not self.pending():
+            return
+        try:
+            written = await asyncio.to_thread(self.flush)
+            print(f" Write-behind flushed {written} row(s) on shutdown")
+        except Exception as e:
+            print(f"[WARN] Write-behind shutdown flush failed: {e}")
+            self._spill()
+
+    def _spill(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {name: [] for name in TABLES}
+        count = 0
+        with open(self.spill_file, "a", encoding="utf-8") as f:
+            for table, rows in batch.items():
+                for row in rows:
+                    f.write(json.dumps({"table": table, "row": row}, default=lambda v: v.isoformat()) + "\n")
+                    count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"[WARN] Spilled {count} unwritten row(s) to {self.spill_file}; they are re-queued on next start")
+
+    def _load_spill(self) -> None:
+        if not os.path.exists(self.spill_file):
+            return
+        count = 0
+        with open(self.spill_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                row = entry["row"]
+                if row.get("created_time"):
+                    row["created_time"] = datetime.fromisoformat(row["created_time"])
+                self._pending[entry["table"]].append(row)
+                count += 1
+        os.remove(self.spill_file)
+        print(f" Re-queued {count} row(s) from {self.spill_file}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": {table: len(rows) for table, rows in self._pending.items()},
+            "max_rows": self.max_rows,
+            "max_delay_ms": int(self.max_delay_s * 1000),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "avg_batch": round(self.rows_written / self.flushes, 2) if self.flushes else 0.0,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+            "dead_letters": list(self.dead_letters),
+            "last_error": self.last_error,
+        }
+
+# Global instance
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Event Loop Lag Benchmark for Campus Smartphone Addiction Project
+Measures how much chat persistence stalls the event loop: a ticker task sleeps
+in short intervals and records how late it wakes up while N concurrent inserts run,
+once through the sync Session (old path, on the loop) and once through AsyncSession.
+
+Usage:
+    python bench_event_loop_lag.py                                  # throwaway SQLite file
+    python bench_event_loop_lag.py --url mysql+pymysql://user:pw@127.0.0.1:3306/bench --requests 500
+    python bench_event_loop_lag.py --concurrency 50 --tick-ms 1
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.database import Base, async_url_for
+
+BENCH_USERCODE = "BENCH0"
+
+def chat_fields(i: int) -> dict:
+    return dict(
+        usercode=BENCH_USERCODE,
+        user_message=f"benchmark message {i}",
+        ai_response="benchmark reply " * 20,
+        model_id="bench",
+        endpoint="bench",
+        tokens_in=10,
+        tokens_out=40,
+        latency_ms=0,
+        session_no=0,
+    )
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+async def measure(run: Callable[[int], Awaitable[None]], requests: int, concurrency: int, tick_s: float) -> Dict[str, float]:
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(tick_s)
+            lags.append((time.perf_counter() - t0 - tick_s) * 1000)
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await run(i)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(tick_s * 5)   # let the ticker settle
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await tick
+    return {
+        "throughput": requests / elapsed,
+        "p50": statistics.median(lags),
+        "p99": percentile(lags, 99),
+        "max": max(lags),
+    }
+
+async def main_async(args) -> int:
+    # Only the tables the benchmark writes to (the full schema may not be portable to every backend)
+    tables = [models.User.__table__, models.UserChat.__table__]
+
+    sync_engine = create_engine(args.url)
+    Base.metadata.create_all(sync_engine, tables=tables)
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    db = SyncSession()
+    try:
+        if not db.query(models.User).filter(models.User.usercode == BENCH_USERCODE).first():
+            db.add(models.User(usercode=BENCH_USERCODE))
+            db.commit()
+    finally:
+        db.close()
+
+    async_engine = create_async_engine(async_url_for(args.url))
+    AsyncSessionMaker = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def sync_path(i: int):
+        # What the endpoints did before: a blocking Session call inside an async def
+        db = SyncSession()
+        try:
+            crud.create_user_chat(db, **chat_fields(i))
+        finally:
+            db.close()
+
+    async def async_path(i: int):
+        async with AsyncSessionMaker() as db:
+            await crud.create_user_chat_async(db, **chat_fields(i))
+
+    print(f" Database: {sync_engine.url.render_as_string(hide_password=True)}")
+    print(f" {args.requests} inserts, concurrency {args.concurrency}, tick {args.tick_ms} ms\n")
+    print(f"{'path':<8}{'inserts/s':>12}{'lag p50 ms':>13}{'lag p99 ms':>13}{'lag max ms':>13}")
+    for name, run in (("sync", sync_path), ("async", async_path)):
+        r = await measure(run, args.requests, args.concurrency, args.tick_ms / 1000)
+        print(f"{name:<8}{r['throughput']:>12.1f}{r['p50']:>13.2f}{r['p99']:>13.2f}{r['max']:>13.2f}")
+
+    if not args.keep_rows:
+        db = SyncSession()
+        try:
+            db.query(models.UserChat).filter(models.UserChat.usercode == BENCH_USERCODE).delete()
+            db.query(models.User).filter(models.User.usercode == BENCH_USERCODE).delete()
+            db.commit()
+        finally:
+            db.close()
+    await async_engine.dispose()
+    sync_engine.dispose()
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare event loop lag of sync vs async chat persistence")
+    parser.add_argument("--url", default="sqlite:///./bench_event_loop_lag.db",
+                        help="Sync SQLAlchemy URL; the async driver is derived from it (default: local SQLite file)")
+    parser.add_argument("--requests", type=int, default=300, help="Inserts per path (default 300)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent inserts (default 20)")
+    parser.add_argument("--tick-ms", type=float, default=2.0, help="Ticker sleep interval in ms (default 2)")
+    parser.add_argument("--keep-rows", action="store_true", help="Don't delete the benchmark rows afterwards")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(main_async(args))
+    except Exception as e:
+        print(f" Benchmark failed: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Index Advisor for Campus Smartphone Addiction Project
+Runs EXPLAIN on the queries behind each endpoint and flags full table scans
+and sorts that don't come from an index. Plans depend on table statistics, so
+run it against a database with realistic data (the optimizer may prefer a scan
+on a near-empty table).
+
+Usage:
+    python explain_queries.py                           # database from .env (DB_*)
+    python explain_queries.py --url sqlite:///./test.db
+    python explain_queries.py --usercode ABC12345 --question-id 3
+Exit code is 1 if any query does a full table scan.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Query
+
+from app import crud, models
+from app.database import create_db_engine
+
+def endpoint_queries(usercode: str, question_id: int, session_no: int) -> List[Tuple[str, object]]:
+    """(label, statement) for the query shapes the endpoints run, with sample parameters."""
+    UR, UC, UF = models.UserResponse, models.UserChat, models.UserFeedback
+    since = datetime(2000, 1, 1)
+
+    # Listings go through crud.keyset_query like the endpoints: first page, then a page after a sample cursor
+    cursor = crud.encode_cursor(SimpleNamespace(created_time=datetime(2025, 9, 1), id=1000))
+    listings = [
+        ("GET /users", Query(models.User), models.User, False),
+        ("GET /user_responses/{usercode}", Query(UR).filter(UR.usercode == usercode), UR, True),
+        ("GET /users/{usercode}/chats?session=N",
+         Query(UC).filter(UC.usercode == usercode, UC.session_no == session_no), UC, True),
+        ("GET /users/{usercode}/feedback?session=N",
+         Query(UF).filter(UF.usercode == usercode, UF.session_no == session_no), UF, True),
+    ]
+    pages = [
+        (f"{label} ({'next page' if page_cursor else 'first page'})",
+         crud.keyset_query(q, model, cursor=page_cursor, limit=None, descending=descending).statement)
+        for label, q, model, descending in listings
+        for page_cursor in (None, cursor)
+    ]
+
+    return [
+        ("GET /users/{usercode}",
+         select(models.User).where(models.User.usercode == usercode)),
+        *pages,
+        ("POST /submit_survey (retro-tag chats)",
+         update(UC).where(UC.usercode == usercode, UC.session_no == 0, UC.created_time >= since).values(session_no=session_no)),
+        ("POST /submit_survey (retro-tag feedback)",
+         update(UF).where(UF.usercode == usercode, UF.session_no == 0, UF.created_time >= since).values(session_no=session_no)),
+        ("GET /question_answers/{question_id}",
+         select(UR.answer).where(UR.question_id == question_id)),
+        ("GET /questions/{question_id}/distribution",
+         select(models.AnswerCount.answer, func.sum(models.AnswerCount.count)).where(
+             models.AnswerCount.question_id == question_id,
+             models.AnswerCount.dimension == "all",
+             models.AnswerCount.dim_value == "",
+         ).group_by(models.AnswerCount.answer)),
+        ("GET /user_latest_responses/{usercode}",
+         select(models.UserLatestResponse).where(models.UserLatestResponse.usercode == usercode)
+         .order_by(models.UserLatestResponse.question_id)),
+        ("POST /submit_survey (latest-answer upsert source)",
+         crud._latest_source().where(UR.usercode == usercode, UR.session_no == session_no)),
+        ("job runner poll (claimable llm_jobs)",
+         select(models.LLMJob.id).where(crud._claimable(datetime.utcnow())).order_by(models.LLMJob.created_time.asc()).limit(4)),
+    ]
+
+def explain(conn, stmt) -> Tuple[List[str], List[str]]:
+    """Returns (plan lines, problems) for one statement on the connection's dialect."""
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    backend = conn.dialect.name
+    lines, problems = [], []
+
+    if backend == "sqlite":
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params):
+            detail = row[-1]
+            lines.append(detail)
+            if detail.startswith("SCAN ") and "INDEX" not in detail:
+                problems.append(f"full scan: {detail}")
+            if "TEMP B-TREE" in detail:
+                problems.append(f"sort without index: {detail}")
+    elif backend == "mysql":
+        result = conn.exec_driver_sql(f"EXPLAIN {compiled}", params)
+        for row in result.mappings():
+            lines.append(f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}".rstrip())
+            if row["type"] == "ALL":
+                problems.append(f"full scan on {row['table']}")
+            if row["Extra"] and "filesort" in row["Extra"]:
+                problems.append(f"filesort on {row['table']}")
+    else:
+        # PostgreSQL and others: text plan
+        for row in conn.exec_driver_sql(f"EXPLAIN {compiled}", params):
+            lines.append(row[0])
+            if "Seq Scan" in row[0]:
+                problems.append(row[0].strip())
+    return lines, problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN the endpoint queries and flag full scans")
+    parser.add_argument("--url", help="SQLAlchemy URL (default: the app database from .env)")
+    parser.add_argument("--usercode", help="Usercode to plug into the queries (default: any existing user)")
+    parser.add_argument("--question-id", type=int, default=1)
+    parser.add_argument("--session", type=int, default=1, help="session_no to plug into the queries")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print the full plan for every query")
+    args = parser.parse_args()
+
+    if args.url:
+        engine = create_db_engine(args.url)
+    else:
+        from app.database import engine
+
+    with engine.connect() as conn:
+        usercode = args.usercode or conn.execute(select(models.User.usercode).limit(1)).scalar() or "SAMPLE00"
+        print(f" Explaining endpoint queries on {engine.url.render_as_string(hide_password=True)} (usercode {usercode})\n")
+
+        flagged = 0
+        full_scans = 0
+        for label, stmt in endpoint_queries(usercode, args.question_id, args.session):
+            try:
+                lines, problems = explain(conn, stmt)
+            except Exception as e:
+                print(f"⚠️  {label}: EXPLAIN failed: {e}")
+                flagged += 1
+                continue
+            print(f"{'✅' if not problems else '⚠️ '} {label}")
+            for problem in problems:
+                print(f"      - {problem}")
+            if args.verbose or problems:
+                for line in lines:
+                    print(f"        {line}")
+            flagged += bool(problems)
+            full_scans += any("scan" in p.lower() for p in problems)
+        conn.rollback()
+
+    print(f"\n {flagged} query shape(s) flagged, {full_scans} with a full table scan")
+    if full_scans:
+        print(" Missing indexes can be added with: python add_composite_indexes.py")
+    return 1 if full_scans else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
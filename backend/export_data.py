@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Study Data Export Script for Campus Smartphone Addiction Project
+Streams users, responses, chats and feedback straight from the database as NDJSON
+or CSV (server-side cursor, constant memory) instead of paging the API per participant.
+
+Usage:
+    python export_data.py                                    # every table as NDJSON into ./export/
+    python export_data.py --table responses --format csv     # -> responses.csv
+    python export_data.py --table chats --session 2 --since 2025-09-01 --until 2025-10-01
+    python export_data.py --table responses --out -          # to stdout
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables (DB_*) before the app modules read them
+load_dotenv()
+
+from app.export import EXPORT_FORMATS, EXPORT_TABLES, export_lines
+
+def write_lines(lines, fmt: str, out) -> int:
+    count = 0
+    for line in lines:
+        out.write(line)
+        count += 1
+    return count - (1 if fmt == "csv" else 0)   # CSV header line
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream study data out of the database as NDJSON or CSV")
+    parser.add_argument("--table", choices=list(EXPORT_TABLES) + ["all"], default="all")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="created_time >= SINCE (ISO date/time)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="created_time < UNTIL (ISO date/time)")
+    parser.add_argument("--session", type=int, help="only this session_no (responses, chats, feedback)")
+    parser.add_argument("--usercode", help="only this participant")
+    parser.add_argument("--out",
+                        help="output file for one table ('-' for stdout; default <table>.<format>), "
+                             "or a directory for --table all (default ./export)")
+    parser.add_argument("--url", help="SQLAlchemy URL (default: the app database from .env)")
+    args = parser.parse_args()
+
+    if args.url:
+        from app.database import create_db_engine
+        engine = create_db_engine(args.url)
+    else:
+        from app.database import engine
+
+    tables = list(EXPORT_TABLES) if args.table == "all" else [args.table]
+    if args.session is not None and args.table == "all":
+        tables.remove("users")   # users has no session_no
+    filters = dict(since=args.since, until=args.until, session_no=args.session, usercode=args.usercode)
+
+    for table in tables:
+        t0 = time.perf_counter()
+        try:
+            lines = export_lines(engine, table, args.format, **filters)   # validates before any file is created
+            if args.out == "-":
+                rows = write_lines(lines, args.format, sys.stdout)
+                target = "stdout"
+            else:
+                if args.table == "all":
+                    out_dir = Path(args.out or "export")
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                    path = out_dir / f"{table}.{args.format}"
+                else:
+                    path = Path(args.out or f"{table}.{args.format}")
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    rows = write_lines(lines, args.format, f)
+                target = str(path)
+        except ValueError as e:
+            print(f" {e}", file=sys.stderr)
+            return 1
+        except Exception as e:
+            print(f" Export of {table} failed: {e}", file=sys.stderr)
+            return 1
+        print(f" {table}: {rows} rows -> {target} ({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
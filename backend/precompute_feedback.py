@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Feedback Corpus Precompute Script for Campus Smartphone Addiction Project
+Generates step feedback for every (question, answer) pair ahead of a session,
+so /v1/survey/answer_feedback can serve it without hitting the GPU live.
+
+Usage:
+    python precompute_feedback.py                      # 1 variant per pair, answers 1-6
+    python precompute_feedback.py --variants 3 --temperature 0.7 --concurrency 4
+    python precompute_feedback.py --only-missing       # resume an interrupted run
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables (LLM_API_BASE etc.) before the app modules read them
+load_dotenv()
+
+from app.feedback_corpus import feedback_corpus
+from app.llm_client import LLMClient, answer_feedback_payload
+from app.question_manager import question_manager
+
+def parse_answers(spec: str) -> List[int]:
+    """'1-6' or '1,2,5' -> list of ints"""
+    if "-" in spec:
+        lo, hi = spec.split("-", 1)
+        return list(range(int(lo), int(hi) + 1))
+    return [int(a) for a in spec.split(",") if a.strip()]
+
+def load_existing(path) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"metadata": {}, "entries": []}
+
+def save_corpus(path, metadata: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+    # Write to a temp file first so a running server never reloads a half-written corpus
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"metadata": metadata, "entries": entries}, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(path)
+
+async def generate_all(args, jobs: List[Tuple[int, str, int, int]]) -> List[Dict[str, Any]]:
+    llm = LLMClient()
+    await llm.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results: List[Dict[str, Any]] = []
+    done = 0
+
+    async def run(question_id: int, question_text: str, answer: int, variant: int) -> None:
+        nonlocal done
+        payload = answer_feedback_payload(
+            "precompute", args.survey_id, question_id, question_text, answer,
+            args.max_new_tokens, args.temperature,
+        )
+        async with semaphore:
+            try:
+                # Variants share a payload; coalescing would hand them all the same completion
+                data, latency_ms = await llm.answer_feedback(payload, coalesce=False)
+            except Exception as e:
+                print(f"   Failed q{question_id} a{answer} v{variant}: {e}")
+                return
+        done += 1
+        results.append({
+            "survey_id": args.survey_id,
+            "question_id": question_id,
+            "answer": answer,
+            "variant": variant,
+            "text": data.get("output", ""),
+            "model": data.get("model"),
+            "latency_ms": latency_ms,
+        })
+        print(f"   [{done}/{len(jobs)}] q{question_id} a{answer} v{variant} ({latency_ms} ms)")
+
+    try:
+        await asyncio.gather(*(run(*job) for job in jobs))
+    finally:
+        await llm.aclose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute step feedback for every (question, answer) pair")
+    parser.add_argument("--survey-id", default="sas-sv-10")
+    parser.add_argument("--answers", default="1-6", help="answer range or list, e.g. 1-6 or 1,3,6")
+    parser.add_argument("--variants", type=int, default=1, help="texts to generate per pair")
+    parser.add_argument("--concurrency", type=int, default=2, help="max in-flight LLM requests")
+    parser.add_argument("--max-new-tokens", type=int, default=220)
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--only-missing", action="store_true", help="keep existing texts and fill the gaps")
+    parser.add_argument("--output", default=None, help="corpus file (default: FEEDBACK_CORPUS_FILE)")
+    args = parser.parse_args()
+
+    print("Feedback Corpus Precompute")
+    print("=" * 50)
+
+    path = Path(args.output) if args.output else feedback_corpus.path()
+    questions = [q for q in question_manager.questions_data["questions"] if q.get("active", True)]
+    answers = parse_answers(args.answers)
+
+    existing = load_existing(path) if args.only_missing else {"metadata": {}, "entries": []}
+    entries = [e for e in existing.get("entries", []) if e.get("text")]
+    have = {(e["survey_id"], e["question_id"], e["answer"], e.get("variant", 0)) for e in entries}
+
+    jobs = [
+        (q["id"], q["text"], answer, variant)
+        for q in questions
+        for answer in answers
+        for variant in range(args.variants)
+        if (args.survey_id, q["id"], answer, variant) not in have
+    ]
+    if args.variants > 1 and args.temperature <= 0.2:
+        print("Note: several variants at a low temperature will likely be near-identical.")
+    print(f"{len(questions)} questions x {len(answers)} answers x {args.variants} variants: {len(jobs)} to generate")
+
+    if jobs:
+        entries.extend(asyncio.run(generate_all(args, jobs)))
+
+    entries.sort(key=lambda e: (e["survey_id"], e["question_id"], e["answer"], e.get("variant", 0)))
+    metadata = {
+        "survey_id": args.survey_id,
+        "generated_at": datetime.utcnow().isoformat(),
+        "max_new_tokens": args.max_new_tokens,
+        "temperature": args.temperature,
+        "variants": args.variants,
+        "questions_version": question_manager.questions_data.get("metadata", {}).get("version", "unknown"),
+    }
+    save_corpus(path, metadata, entries)
+
+    missing = len(questions) * len(answers) * args.variants - len(
+        [e for e in entries if e["survey_id"] == args.survey_id]
+    )
+    print(f"\nWrote {len(entries)} feedback texts to {path}")
+    if missing > 0:
+        print(f"{missing} texts are still missing; rerun with --only-missing to fill them")
+    print("Reload a running server with: POST /llm/feedback_corpus/reload")
+    return missing <= 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -2,32 +2,41 @@
 """
 Script to recreate database tables with correct MySQL structure
 This fixes the autoincrement issues and table constraints.
+Uses DATABASE_URL (or the DB_* settings). On MySQL the tables get the explicit DDL below;
+on SQLite / PostgreSQL they are created from app/models.py, which holds the same schema.
 """
 
 import os
 import sys
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.database import Base, create_db_engine
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
 # Load environment variables
 load_dotenv()
 
 def recreate_tables():
     """Drop and recreate all tables with correct structure"""
     try:
-        # Create engine
-        engine = create_engine(
-            f"mysql+pymysql://{os.getenv('DB_USER', 'user')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', '127.0.0.1')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'campus_smartphone_addiction')}",
-            pool_pre_ping=True,
-            echo=True  # Show SQL for debugging
-        )
+        # Create engine (echo: show SQL for debugging)
+        engine = create_db_engine(echo=True)
 
         with engine.begin() as connection:
             print("Dropping existing tables...")
 
             # Drop tables in reverse dependency order
             tables_to_drop = [
+                "user_latest_responses",
+                "answer_counts",
+                "submission_keys",
+                "llm_jobs",
+                "user_feedback",
                 "user_responses",
                 "user_chats",
                 "users",
@@ -36,7 +45,7 @@ def recreate_tables():
 
             for table in tables_to_drop:
                 try:
-                    connection.execute(text(f"DROP TABLE IF EXISTS `{table}`"))
+                    connection.execute(text(f"DROP TABLE IF EXISTS {connection.dialect.identifier_preparer.quote(table)}"))
                     print(f"   Dropped table: {table}")
                 except Exception as e:
                     print(f"   Could not drop {table}: {e}")
@@ -45,57 +54,101 @@ def recreate_tables():
 
             print("\nRecreating tables with correct structure...")
 
-            # Create questions table
-            connection.execute(text("""
-                CREATE TABLE questions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    text VARCHAR(500) UNIQUE NOT NULL,
-                    INDEX idx_text (text)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """))
-            print("   Created table: questions")
-
-            # Create users table
-            connection.execute(text("""
-                CREATE TABLE users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    usercode VARCHAR(50) UNIQUE NOT NULL,
-                    age VARCHAR(10),
-                    gender VARCHAR(20),
-                    country VARCHAR(100),
-                    education VARCHAR(50),
-                    field VARCHAR(100),
-                    yearsOfStudy VARCHAR(10),
-                    INDEX idx_usercode (usercode)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """))
-            print("  Created table: users")
-
-            # Create user_responses table (with timestamp column)
-            connection.execute(text("""
-                CREATE TABLE user_responses (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    question_id INT NOT NULL,
-                    answer INT NOT NULL,
-                    chat_history TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    usercode VARCHAR(50) NOT NULL,
-                    INDEX idx_question_id (question_id),
-                    INDEX idx_usercode (usercode),
-                    FOREIGN KEY (usercode) REFERENCES users(usercode) ON DELETE CASCADE
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """))
-            print("  Created table: user_responses")
-            # Create user_chats table
-            connection.execute(text("""
-                CREATE TABLE user_chats (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_message TEXT,
-                    ai_response TEXT,
-                    timestamp INT
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """))
-            print("  Created table: user_chats")
+            if connection.dialect.name != "mysql":
+                # Portable path: the models declare the same columns and indexes as the DDL below
+                Base.metadata.create_all(bind=connection)
+                print(f"  Created all tables from app/models.py ({connection.dialect.name})")
+            else:
+                # Create questions table
+                connection.execute(text("""
+                    CREATE TABLE questions (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        text VARCHAR(500) UNIQUE NOT NULL,
+                        INDEX idx_text (text)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """))
+                print("   Created table: questions")
+
+                # Create users table
+                connection.execute(text("""
+                    CREATE TABLE users (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        usercode VARCHAR(50) UNIQUE NOT NULL,
+                        age VARCHAR(10),
+                        gender VARCHAR(20),
+                        country VARCHAR(100),
+                        education VARCHAR(50),
+                        field VARCHAR(100),
+                        yearsOfStudy VARCHAR(10),
+                        session_count INT DEFAULT 0,
+                        session_start_time DATETIME NULL,
+                        created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX idx_usercode (usercode),
+                        INDEX ix_users_created_id (created_time, id)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """))
+                print("  Created table: users")
+
+                # Create user_responses table (composite indexes match the endpoint query shapes, see app/models.py)
+                connection.execute(text("""
+                    CREATE TABLE user_responses (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        question_id INT NOT NULL,
+                        answer INT NOT NULL,
+                        usercode VARCHAR(50) NOT NULL,
+                        session_no INT DEFAULT 0,
+                        created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX idx_session_no (session_no),
+                        INDEX ix_user_responses_usercode_created (usercode, created_time),
+                        INDEX ix_user_responses_usercode_question_created (usercode, question_id, created_time),
+                        INDEX ix_user_responses_question_answer (question_id, answer),
+                        FOREIGN KEY (usercode) REFERENCES users(usercode) ON DELETE CASCADE
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """))
+                print("  Created table: user_responses")
+                # Create user_chats table
+                connection.execute(text("""
+                    CREATE TABLE user_chats (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        usercode VARCHAR(50) NULL,
+                        user_message TEXT,
+                        ai_response TEXT,
+                        session_no INT DEFAULT 0,
+                        created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        model_id VARCHAR(120),
+                        endpoint VARCHAR(200),
+                        tokens_in INT DEFAULT 0,
+                        tokens_out INT DEFAULT 0,
+                        latency_ms INT DEFAULT 0,
+                        ttft_ms INT NULL,
+                        INDEX idx_session_no (session_no),
+                        INDEX ix_user_chats_usercode_session_created (usercode, session_no, created_time),
+                        FOREIGN KEY (usercode) REFERENCES users(usercode) ON DELETE CASCADE
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """))
+                print("  Created table: user_chats")
+
+                # Create user_feedback table
+                connection.execute(text("""
+                    CREATE TABLE user_feedback (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        usercode VARCHAR(50) NOT NULL,
+                        question_id INT,
+                        feedback_text TEXT,
+                        feedback_type VARCHAR(50) DEFAULT 'general',
+                        session_no INT DEFAULT 0,
+                        created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX idx_question_id (question_id),
+                        INDEX idx_session_no (session_no),
+                        INDEX ix_user_feedback_usercode_session_created (usercode, session_no, created_time),
+                        FOREIGN KEY (usercode) REFERENCES users(usercode) ON DELETE CASCADE
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """))
+                print("  Created table: user_feedback")
+
+                # Remaining tables (llm_jobs, submission_keys, answer_counts, user_latest_responses) straight from the models
+                Base.metadata.create_all(bind=connection)
+                print("  Created tables: llm_jobs, submission_keys, answer_counts, user_latest_responses")
 
             print("\nAll tables recreated successfully!")
 
@@ -122,6 +175,10 @@ def recreate_tables():
                 )
                 print(f"   Added question {i}: {question_text[:50]}...")
 
+            if connection.dialect.name == "postgresql":
+                # Explicit ids don't advance the serial sequence
+                connection.execute(text("SELECT setval(pg_get_serial_sequence('questions', 'id'), (SELECT MAX(id) FROM questions))"))
+
             print(f"Inserted {len(sample_questions)} sample questions!")
 
             return True
@@ -131,7 +188,7 @@ def recreate_tables():
         return False
 
 def main():
-    print("Recreating Database Tables for MySQL...")
+    print("Recreating Database Tables...")
     print("=" * 50)
 
     if recreate_tables():
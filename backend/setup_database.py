@@ -45,11 +45,8 @@ def test_connection():
     """Test the database connection"""
     try:
         # Test connection to the specific database
-        engine = create_engine(
-            f"mysql+pymysql://{os.getenv('DB_USER', 'user')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', '127.0.0.1')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'campus_smartphone_addiction')}",
-            pool_pre_ping=True,
-            echo=False
-        )
+        from app.database import create_db_engine
+        engine = create_db_engine()
         
         with engine.connect() as connection:
             result = connection.execute(text("SELECT 1"))
@@ -60,12 +57,31 @@ def test_connection():
         print(f" Database connection test failed: {e}")
         return False
 
+def create_tables():
+    """Create missing tables and the composite indexes declared in app/models.py"""
+    try:
+        from app.database import Base, engine
+        from add_composite_indexes import create_composite_indexes
+
+        Base.metadata.create_all(bind=engine)   # new tables get all their indexes here
+        created = create_composite_indexes(engine)  # existing tables get the missing composite ones
+        print(f" Tables verified, {created} composite index(es) added")
+        return True
+
+    except Exception as e:
+        print(f" Error creating tables: {e}")
+        return False
+
 def main():
     print(" Setting up Campus Smartphone Addiction Database...")
     print("=" * 50)
     
-    # Check if required environment variables are set
-    required_vars = ["DB_USER", "DB_PASSWORD"]
+    from app.database import DATABASE_URL
+    from sqlalchemy.engine import make_url
+    mysql = make_url(DATABASE_URL).get_backend_name() == "mysql"
+
+    # Check if required environment variables are set (MySQL from DB_* only)
+    required_vars = [] if os.getenv("DATABASE_URL") else ["DB_USER", "DB_PASSWORD"]
     missing_vars = [var for var in required_vars if not os.getenv(var) or os.getenv(var) == "your_mysql_password_here"]
     
     if missing_vars:
@@ -76,19 +92,23 @@ def main():
         print("   You can copy database_config.env to .env and modify it.")
         return False
     
-    # Create database
-    if not create_database():
+    # Create database (SQLite creates the file itself; PostgreSQL databases are created by the admin)
+    if mysql and not create_database():
         return False
     
     # Test connection
     if not test_connection():
         return False
+
+    # Create tables and indexes
+    if not create_tables():
+        return False
     
     print("\n Database setup completed successfully!")
     print(" Next steps:")
     print("   1. Start your FastAPI server: uvicorn app.main:app --reload")
-    print("   2. The server will automatically create the required tables")
-    print("   3. Check the console output for any warnings or errors")
+    print("   2. Check the console output for any warnings or errors")
+    print("   3. Check index usage with: python explain_queries.py")
     
     return True
 
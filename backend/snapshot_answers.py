@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Answer Snapshot Script for Campus Smartphone Addiction Project
+Writes the participant-session x question answer matrix, with the demographics from
+users, as a columnar snapshot (Arrow IPC / Parquet with pyarrow, .npy with numpy).
+Each run only reads responses newer than the snapshot's created_time watermark and
+appends them as a new part, so it can run from cron.
+
+Usage:
+    python snapshot_answers.py                            # ./snapshot, arrow if pyarrow is installed
+    python snapshot_answers.py --out /data/snap --format parquet
+    python snapshot_answers.py --full                     # rebuild from scratch
+    python snapshot_answers.py --info                     # show the manifest, don't update
+
+Loading it:
+    from app.snapshot import load_snapshot
+    table = load_snapshot("snapshot")     # pyarrow.Table (table.to_pandas()), or dict of numpy arrays for npy
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables (DB_*) before the app modules read them
+load_dotenv()
+
+from app.snapshot import available_formats, load_snapshot, read_manifest, run_snapshot
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incremental columnar snapshot of the survey answers")
+    parser.add_argument("--out", default="snapshot", help="snapshot directory (default ./snapshot)")
+    parser.add_argument("--format", choices=["arrow", "parquet", "npy"],
+                        help=f"default: the existing snapshot's format, else the first installed ({', '.join(available_formats()) or 'none'})")
+    parser.add_argument("--full", action="store_true", help="discard the existing snapshot and rebuild it")
+    parser.add_argument("--info", action="store_true", help="print the manifest and load time, then exit")
+    parser.add_argument("--url", help="SQLAlchemy URL (default: the app database from .env)")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out)
+
+    if args.info:
+        manifest = read_manifest(out_dir)
+        if manifest is None:
+            print(f" No snapshot in {out_dir}", file=sys.stderr)
+            return 1
+        print(json.dumps(manifest, indent=2))
+        t0 = time.perf_counter()
+        load_snapshot(out_dir)
+        print(f" Loaded {manifest['rows']} sessions in {(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
+        return 0
+
+    if args.url:
+        from app.database import create_db_engine
+        engine = create_db_engine(args.url)
+    else:
+        from app.database import engine
+
+    t0 = time.perf_counter()
+    try:
+        part = run_snapshot(engine, out_dir, fmt=args.format, full=args.full)
+    except (ValueError, RuntimeError) as e:
+        print(f" {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f" Snapshot failed: {e}", file=sys.stderr)
+        return 1
+
+    manifest = read_manifest(out_dir) or {}
+    if not part:
+        print(f" No new responses since {manifest.get('watermark')}; snapshot unchanged", file=sys.stderr)
+    else:
+        print(f" {part['file']}: {part['rows']} sessions up to {part['watermark']} "
+              f"({time.perf_counter() - t0:.1f}s), {manifest['rows']} in total", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
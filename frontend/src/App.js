@@ -5,7 +5,7 @@ import SurveyInstructionsPage from "./components/SurveyInstructionsPage";
 import HelpModal from "./components/HelpModal";
 import AnswerDistributionChart from "./components/AnswerDistributionChart";
 import LLMChatBox from "./components/LLMChatBox";
-import { startSession, answerFeedback as fetchAnswerFeedback, chatLLM as callChatLLM, finalSurveyFeedback, submitSurvey } from "./api";
+import { startSession, answerFeedback as fetchAnswerFeedback, chatLLM as callChatLLM, finalSurveyFeedback, submitSurvey, newSubmissionId } from "./api";
 
 // Add global style for body background and improved card/header separation
 if (typeof window !== 'undefined') {
@@ -1038,6 +1038,8 @@ export default function App() {
   const [finalFeedbackText, setFinalFeedbackText] = useState("");
   const [finishLoading, setFinishLoading] = useState(false);
   const [finishError, setFinishError] = useState("");
+  // One id per survey run, reused when "Finish" is retried so the backend doesn't count it twice
+  const [submissionId, setSubmissionId] = useState(null);
 
   const [submittedQuestions, setSubmittedQuestions] = useState(new Set());
   const [pendingDemographics, setPendingDemographics] = useState(null);
@@ -1097,7 +1099,9 @@ export default function App() {
     setChartLoading(true);
     setChartError(null);
     
-    fetch(`http://localhost:8000/question_answers/${questionId}`)
+    // usercode lets the backend read from the primary right after this participant's own writes
+    const query = usercode ? `?usercode=${encodeURIComponent(usercode)}` : "";
+    fetch(`http://localhost:8000/questions/${questionId}/distribution${query}`)
       .then(res => {
         if (!res.ok) {
           throw new Error(`HTTP error! status: ${res.status}`);
@@ -1105,17 +1109,9 @@ export default function App() {
         return res.json();
       })
       .then(data => {
-        // Defensive: ensure data is an array
-        let arr = [];
-        if (Array.isArray(data)) {
-          // The backend returns a simple array of integers from other users
-          arr = data;
-        } else if (data && typeof data === 'object' && 'answer' in data) {
-          arr = [data.answer];
-        } else {
-          arr = [];
-        }
-        setChartData(arr);
+        // Backend returns per-answer counts: { counts: { "1": n1, ..., "6": n6 }, total }
+        const counts = [1, 2, 3, 4, 5, 6].map(val => Number(data?.counts?.[val] ?? 0));
+        setChartData(counts);
         setChartLoading(false);
       })
       .catch((error) => {
@@ -1656,7 +1652,7 @@ export default function App() {
                    {!chartLoading && !chartError && (
                      <div key={`chart-${current.qIndex}-${answers[current.qIndex]}-${chartKey}`}>
                        <AnswerDistributionChart 
-                         answers={chartData} 
+                         counts={chartData} 
                          userAnswer={answers[current.qIndex]} 
                        />
                      </div>
@@ -2042,7 +2038,10 @@ export default function App() {
       setFinalFeedbackText(ff?.text || "");
 
       // 2) Persist survey + increment session + re-tag sessions for chats/feedback
-      await submitSurvey({ usercode, answersMap });
+      const sid = submissionId || newSubmissionId();
+      setSubmissionId(sid);
+      await submitSurvey({ usercode, answersMap, submissionId: sid });
+      setSubmissionId(null);
 
       // 3) Show completion page
       setSurveyCompleted(true);
@@ -100,8 +100,14 @@ export async function finalSurveyFeedback({ usercode, survey_id, all_answers, su
   return data;
 }
 
+// Client-generated id for one survey run; sent as Idempotency-Key so retries are not counted twice
+export function newSubmissionId() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 // --- Submit survey (persist + increment session, re-tag chats/feedback) ---
-export async function submitSurvey({ usercode, answersMap }) {
+export async function submitSurvey({ usercode, answersMap, submissionId }) {
   // Backend expects answers keyed by question_id
   // payload shape used previously in your app
   const url = `${API_URL}/submit_survey`;
@@ -110,6 +116,7 @@ export async function submitSurvey({ usercode, answersMap }) {
     answers: answersMap,
     completed_at: new Date().toISOString()
   };
-  const { data } = await axios.post(url, body);
+  const headers = submissionId ? { "Idempotency-Key": submissionId } : {};
+  const { data } = await axios.post(url, body, { headers });
   return data;
 }
@@ -4,12 +4,13 @@ import { Chart, BarElement, CategoryScale, LinearScale, Tooltip, Legend } from "
 
 Chart.register(BarElement, CategoryScale, LinearScale, Tooltip, Legend);
 
-export default function AnswerDistributionChart({ answers, userAnswer }) {
-  // answers: array of integers (all answers for this question from other users)
+export default function AnswerDistributionChart({ counts, userAnswer }) {
+  // counts: number of participants per answer 1-6, from /questions/{id}/distribution
   // userAnswer: the current user's answer (integer)
-  
+  const totalResponses = (counts || []).reduce((sum, n) => sum + n, 0);
+
   // Handle empty data case
-  if (!answers || answers.length === 0) {
+  if (totalResponses === 0) {
     return (
       <div style={{ background: "#f9f9f9", border: "1px solid #ddd", borderRadius: 10, padding: 16, margin: "16px 0", minHeight: 220 }}>
         <div style={{ fontWeight: "bold", marginBottom: 10 }}>How does your answer compare to others?</div>
@@ -40,9 +41,7 @@ export default function AnswerDistributionChart({ answers, userAnswer }) {
     );
   }
 
-  const counts = [1, 2, 3, 4, 5, 6].map(val => answers.filter(a => a === val).length);
   const normalizedUserAnswer = Number.isFinite(Number(userAnswer)) ? Math.max(1, Math.min(6, Number(userAnswer))) : 3;
-  const totalResponses = answers.length;
   const userAnswerCount = counts[normalizedUserAnswer - 1] ?? 0;
   const userAnswerPercentage = totalResponses > 0 ? Math.round((userAnswerCount / totalResponses) * 100) : 0;
 